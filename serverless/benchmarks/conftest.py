@@ -0,0 +1,97 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from tests.conftest import *  # noqa: F401, F403 -> mocked AWS fixtures are shared with the tests
+
+# stages below these values are dominated by noise, so they are not compared with the baseline
+NOISE_FLOOR = {"seconds": 0.05, "peak_memory_mb": 1.0}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmark-output", default="benchmark-results.json", help="Path to JSON file with results")
+    parser.addoption("--benchmark-repeat", default=3, type=int, help="Number of timed runs of each stage")
+    parser.addoption("--benchmark-compare", default=None, help="Path to JSON file with baseline results")
+    parser.addoption(
+        "--benchmark-max-regression",
+        default=0.25,
+        type=float,
+        help="Fail when time or peak memory of the stage exceeds the baseline by more than this fraction",
+    )
+
+
+@pytest.fixture(scope="session")
+def benchmark_results(request):
+    """Results of all benchmarks, written to JSON file at the end of the session"""
+    results = []
+    yield results
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    Path(request.config.getoption("--benchmark-output")).write_text(json.dumps(report, indent=2))
+
+
+@pytest.fixture(scope="session")
+def baseline(request) -> dict[tuple[str, str], dict]:
+    path = request.config.getoption("--benchmark-compare")
+    if path is None:
+        return {}
+
+    results = json.loads(Path(path).read_text())["results"]
+    return {(result["benchmark"], result["stage"]): result for result in results}
+
+
+@pytest.fixture
+def measure(request, benchmark_results, baseline) -> Callable:
+    """
+    Measure the stage, returns function called with `prepare` creating fresh input for each run and `function`
+    running the stage on the input
+    Time is the best of the timed runs, peak memory of Python allocations (including numpy and pandas buffers) is
+    measured in separate run, since tracing allocations slows down the stage
+    """
+    repeat = request.config.getoption("--benchmark-repeat")
+    max_regression = request.config.getoption("--benchmark-max-regression")
+
+    def run(stage: str, prepare: Callable[[], Any], function: Callable[[Any], Any]) -> Any:
+        timings = []
+        for _ in range(repeat):
+            data = prepare()
+            start = time.perf_counter()
+            result = function(data)
+            timings.append(time.perf_counter() - start)
+
+        data = prepare()
+        tracemalloc.start()
+        function(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        record = {
+            "benchmark": request.node.name,
+            "stage": stage,
+            "params": request.node.callspec.params if hasattr(request.node, "callspec") else {},
+            "seconds": min(timings),
+            "median_seconds": statistics.median(timings),
+            "peak_memory_mb": peak / 2**20,
+        }
+        benchmark_results.append(record)
+
+        if previous := baseline.get((record["benchmark"], stage)):
+            for metric, floor in NOISE_FLOOR.items():
+                if record[metric] > max(previous[metric], floor) * (1 + max_regression):
+                    pytest.fail(f"{stage} {metric} regressed from {previous[metric]:.3f} to {record[metric]:.3f}")
+
+        return result
+
+    return run
@@ -0,0 +1,127 @@
+import itertools
+import os
+
+import awswrangler as wr
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.generate_readings import GeneratorConfig, generate
+from tests import settings
+
+# batches larger than this are passed to the reporter as parquet files, as the receiver would do
+MAX_EVENT_ROWS = 1000
+
+
+@pytest.fixture(scope="function")
+def benchmark_env(mocked_s3, mocked_dynamodb, mocked_sns, mocked_sqs, mocker):
+    _, queue_url = mocked_sqs
+    _, topic_arn = mocked_sns
+
+    env = {
+        "ENV": "test",
+        "AWS_REGION": settings.TEST_AWS_REGION,
+        "AWS_DEFAULT_REGION": settings.TEST_AWS_REGION,
+        "SENSOR_REGISTRY_TABLE": settings.SENSOR_REGISTRY_TABLE,
+        "LAMBDA_IDEMPOTENCY_TABLE": settings.IDEMPOTENCY_TABLE,
+        "SNS_TOPIC_ARN": topic_arn,
+        "SQS_URL": queue_url,
+        "INPUT_BUCKET": settings.INPUT_BUCKET_NAME,
+        "PAYLOAD_BUCKET": settings.PAYLOAD_BUCKET_NAME,
+    }
+    mocker.patch.dict(os.environ, env)  # patch environment variables before importing handlers
+    return env
+
+
+def make_readings(num_rows: int, num_locations: int, seed: int = 42) -> pd.DataFrame:
+    """Readings of the receiver input, with skewed rates of locations, failing sensors, spikes and late readings"""
+    data = pd.concat(generate(num_rows, GeneratorConfig(locations=num_locations), seed=seed), ignore_index=True)
+    return data.assign(timestamp=np.datetime_as_string(data["timestamp"].to_numpy(), unit="us"))
+
+
+@pytest.mark.parametrize("num_readings", (1, 10, 100))
+def test_benchmark_sensor_lambda(num_readings: int, benchmark_env, measure):
+    from src.sensor_lambda import sensor
+    from src.sensor_lambda.main import main
+
+    rng = np.random.default_rng(42)
+    sensor_ids = itertools.count()
+
+    def prepare() -> list[dict]:
+        # new sensors in each run, so each run registers them in the same way
+        values = rng.uniform(sensor.MIN_R, sensor.MAX_R, num_readings)
+        return [
+            {"sensor_id": str(next(sensor_ids)), "location_id": str(index % 100), "value": float(value)}
+            for index, value in enumerate(values)
+        ]
+
+    response = measure("sensor", prepare, main)
+    assert response["status_code"] == 200
+
+
+@pytest.mark.parametrize(
+    ["num_readings", "num_locations", "target_rows"],
+    (
+        (1, 1, 0),
+        (1_000, 10, 0),
+        (100_000, 1, 0),
+        (100_000, 100, 0),
+        (100_000, 10_000, 10_000),  # single batch for each of many locations spends most of the time in uploads
+    ),
+)
+def test_benchmark_receiver_lambda(
+    num_readings: int, num_locations: int, target_rows: int, benchmark_env, lambda_context, measure, mocker
+):
+    from src.receiver_lambda import main as receiver
+    from src.receiver_lambda.main import handler
+
+    mocker.patch.object(receiver.context, "batch_target_rows", target_rows)
+    data = make_readings(num_readings, num_locations)
+
+    def prepare() -> dict:
+        wr.s3.to_csv(data, f"s3://{settings.INPUT_BUCKET_NAME}/benchmark.csv", index=False)
+        return {"source": "S3", "key": "benchmark.csv"}
+
+    response = measure("receiver", prepare, lambda event: handler(event, lambda_context))
+    assert response["status_code"] == 200
+
+
+@pytest.mark.parametrize(["num_readings", "num_locations"], ((1, 1), (1_000, 1), (100_000, 1), (100_000, 10_000)))
+def test_benchmark_reporter_lambda(num_readings: int, num_locations: int, benchmark_env, lambda_context, measure):
+    from src.reporter_lambda.main import handler
+
+    data = make_readings(num_readings, num_locations)
+    packed = num_locations > 1  # batch with multiple locations is packed by the receiver
+
+    def prepare() -> dict:
+        if num_readings <= MAX_EVENT_ROWS:
+            return {"batch": data.to_dict("records"), "source": "EVENT", "packed": packed}
+
+        path = f"s3://{settings.PAYLOAD_BUCKET_NAME}/benchmark.parquet"
+        wr.s3.to_parquet(data.assign(timestamp=pd.to_datetime(data["timestamp"])), path, index=False)
+        return {"batch": path, "source": "S3_PARQUET", "packed": packed}
+
+    response = measure("reporter", prepare, lambda event: handler(event, lambda_context))
+    assert response
+
+
+@pytest.mark.parametrize(["num_readings", "num_locations"], ((100_000, 1), (100_000, 10)))
+def test_benchmark_reporter_lambda_state(
+    num_readings: int, num_locations: int, benchmark_env, mocked_dynamodb, lambda_context, measure, mocker
+):
+    from src.reporter_lambda import main
+
+    mocker.patch.object(main.context, "state_table", settings.AGGREGATE_STATE_TABLE)
+    mocker.patch.object(main.context, "dynamodb_client", mocked_dynamodb)
+
+    data = make_readings(num_readings, num_locations)
+    runs = itertools.count()
+
+    def prepare() -> dict:
+        # new path in each run, so each run merges new batch instead of skipping the merged one
+        path = f"s3://{settings.PAYLOAD_BUCKET_NAME}/benchmark-{next(runs)}.parquet"
+        wr.s3.to_parquet(data.assign(timestamp=pd.to_datetime(data["timestamp"])), path, index=False)
+        return {"batch": path, "source": "S3_PARQUET", "packed": num_locations > 1}
+
+    response = measure("reporter", prepare, lambda event: main.handler(event, lambda_context))
+    assert response
@@ -38,7 +38,9 @@ module "reporter_lambda" {
   max_parallel_executions = floor(0.4 * local.config["lambdas"]["max_parallel_executions"])
 
   env_variables = {
-    PAYLOAD_BUCKET = aws_s3_bucket.sfn_payloads.bucket
+    PAYLOAD_BUCKET     = aws_s3_bucket.sfn_payloads.bucket
+    # state between the runs is opt-in, since it adds write for each location and hour of the batch
+    REPORT_STATE_TABLE = local.config["lambdas"]["analytics"]["report_state"] ? aws_dynamodb_table.sensor_aggregates.name : ""
   }
 }
 
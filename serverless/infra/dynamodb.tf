@@ -24,3 +24,26 @@ resource "aws_dynamodb_table" "sensor_lambda_persistence_layer" {
     enabled        = true
   }
 }
+
+resource "aws_dynamodb_table" "sensor_aggregates" {
+  name         = "sensor-aggregates-${local.env}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "location_id"
+  range_key    = "hour"
+
+  attribute {
+    name = "location_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "hour"
+    type = "S"
+  }
+
+  # items expire after REPORT_STATE_TTL_HOURS since the last update
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
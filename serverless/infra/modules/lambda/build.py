@@ -1,8 +1,12 @@
 import argparse
+import hashlib
 import json
+import shutil
 import subprocess
 import sys
-import shutil
+import sysconfig
+import tempfile
+import time
 from pathlib import Path
 
 
@@ -11,29 +15,136 @@ def parse_args():
     parser.add_argument("--source", required=True, help="Path to source code")
     parser.add_argument("--target", required=True, help="Path to target build directory")
     parser.add_argument("--shared", required=True, help="Path(s) to shared code")
+    parser.add_argument("--cache", default=None, help="Path to build cache shared by all functions")
+    parser.add_argument("--platform", default=None, help="Platform of installed wheels, host platform by default")
+    parser.add_argument("--python-version", default=None, help="Python version of installed wheels, host by default")
+
+    return parser.parse_args()
+
+
+def collect_files(paths: list[Path], bytecode: bool = False) -> dict[str, Path]:
+    """
+    Files of the package by their relative path, files of later paths shadow the same files of earlier paths
+    Bytecode of the source code is skipped by default, since it is rewritten by each local run
+    """
+    files = {}
+    for root in paths:
+        for path in sorted(root.rglob("*")):
+            if path.is_file() and (bytecode or "__pycache__" not in path.parts):
+                files[path.relative_to(root).as_posix()] = path
+    return files
+
+
+def content_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def dependencies_key(requirements: Path, platform: str, python_version: str) -> str:
+    """Key of installed dependencies, which depend only on the requirements and the platform they are installed for"""
+    digest = hashlib.sha256(requirements.read_bytes())
+    digest.update(f"{platform}-{python_version}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def install_dependencies(
+    requirements: Path, cache: Path, platform: str | None, python_version: str | None
+) -> tuple[Path, bool]:
+    """
+    Returns the directory with installed requirements and whether it was found in the cache
+    Dependencies are installed into temporary directory and renamed, so concurrent builds never use partial install
+    """
+    key = dependencies_key(
+        requirements,
+        platform or sysconfig.get_platform(),
+        python_version or f"{sys.version_info.major}.{sys.version_info.minor}",
+    )
+    layer = cache / "dependencies" / key
+    if layer.exists():
+        return layer, True
+
+    layer.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=layer.parent, prefix=f".{key}-"))
+
+    command = [sys.executable, "-m", "pip", "install", "-r", str(requirements), "--target", str(staging)]
+    if platform:
+        command += ["--platform", platform]
+    if python_version:
+        command += ["--python-version", python_version]
+    if platform or python_version:  # pip can not build from source for other platform
+        command += ["--only-binary=:all:"]
+
+    try:
+        subprocess.check_call(command)
+    except subprocess.CalledProcessError:
+        shutil.rmtree(staging)
+        raise
+
+    try:
+        staging.rename(layer)
+    except OSError:  # the same dependencies were installed by concurrent build
+        shutil.rmtree(staging)
+
+    return layer, False
+
+
+def sync(files: dict[str, tuple[Path, str]], target: Path, manifest: Path) -> tuple[int, int, int]:
+    """
+    Copy files with fingerprint changed since the previous build and remove files not in the package anymore
+    Returns the number of copied, unchanged and removed files
+    """
+    previous = json.loads(manifest.read_text()) if manifest.exists() else None
+    if previous is None and target.exists():
+        shutil.rmtree(target)  # contents of target built without manifest are unknown
+
+    previous = previous or {}
+    copied = 0
+    for name, (path, fingerprint) in files.items():
+        destination = target / name
+        if previous.get(name) == fingerprint and destination.exists():
+            continue
+
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(path, destination)
+        copied += 1
+
+    removed = [name for name in previous if name not in files]
+    for name in removed:
+        (target / name).unlink(missing_ok=True)
+    prune_directories(target)
+
+    manifest.write_text(json.dumps({name: fingerprint for name, (_, fingerprint) in files.items()}))
+    return copied, len(files) - copied, len(removed)
+
 
-    args = parser.parse_args()
-    return args.source, args.target, args.shared
+def prune_directories(target: Path):
+    """Remove directories left empty by removed files, deepest first, so they do not end up in the zip"""
+    for directory in sorted((path for path in target.rglob("*") if path.is_dir()), key=lambda path: -len(path.parts)):
+        if not any(directory.iterdir()):
+            directory.rmdir()
 
 
 if __name__ == "__main__":
-    source, target, shared = parse_args()
-    source = Path(source)
-    target = Path(target)
-    shared = json.loads(shared)
+    args = parse_args()
+    source = Path(args.source)
+    target = Path(args.target)
+    shared = json.loads(args.shared)
+    cache = Path(args.cache) if args.cache else target.parent / ".cache"
+    start = time.perf_counter()
 
     print(f"Building lambda function from {source} path")
-    print("Step 1: Copying source code to target directory")
-    shutil.copytree(source, target, dirs_exist_ok=True)
+    print(f"Step 1: Collecting source code and shared code: {shared}")
+    sources = collect_files([source, *map(Path, shared)])
+    files = {name: (path, content_hash(path)) for name, path in sources.items()}
 
-    print(f"Step 2: Copying shared code to target directory: {shared}")
-    for path in shared:
-        shutil.copytree(path, target, dirs_exist_ok=True)
+    print("Step 2: Installing dependencies")
+    if "requirements.txt" in sources:
+        layer, hit = install_dependencies(sources["requirements.txt"], cache, args.platform, args.python_version)
+        print(f"Dependencies {layer.name}: {'cache hit' if hit else 'cache miss, installed'}")
+        # installed dependencies never change, so their files are identified by the directory they are installed in
+        files |= {name: (path, layer.name) for name, path in collect_files([layer], bytecode=True).items()}
 
-    print("Step 3: Running pip install")
-    if (target / "requirements.txt").exists():
-        subprocess.check_call(
-            [sys.executable, "-m", "pip", "install", "-r", str(target / "requirements.txt"), "--target", str(target)]
-        )
+    print("Step 3: Copying changed files to target directory")
+    copied, unchanged, removed = sync(files, target, manifest=target.parent / f".{target.name}.manifest.json")
+    print(f"Copied {copied} files, {unchanged} unchanged (cache hit), removed {removed}")
 
-    print(f"Building lambda from {source} completed!")
+    print(f"Building lambda from {source} completed in {time.perf_counter() - start:.2f} s!")
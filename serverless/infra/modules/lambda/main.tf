@@ -12,11 +12,14 @@ resource "null_resource" "build_lambda" {
       for file in fileset(var.source_code_path, "**") :
       file => filesha256("${var.source_code_path}/${file}")
     })
+    # wheels depend on the runtime, so changing it rebuilds the dependencies
+    runtime = var.runtime
   }
 
   provisioner "local-exec" {
     # python script to build the lambda function, list of paths is passed as JSON
-    command = "python ${path.module}/build.py --source ${var.source_code_path} --target ${local.build_dir} --shared ${jsonencode(var.shared_code_paths)}"
+    # wheels are installed for the runtime of the function, not for the platform and python of the build host
+    command = "python ${path.module}/build.py --source ${var.source_code_path} --target ${local.build_dir} --shared ${jsonencode(var.shared_code_paths)} --platform manylinux2014_x86_64 --python-version ${trimprefix(var.runtime, "python")}"
   }
 }
 
@@ -0,0 +1,70 @@
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+import click
+import numpy as np
+import pandas as pd
+
+# reporter module is imported the same way as in the lambda function on AWS
+sys.path.append(str(Path(__file__).parents[1] / "src" / "reporter_lambda"))
+
+import aggregate  # noqa: E402
+
+
+def benchmark(function: Callable[[], Any], repeat: int) -> float:
+    """Returns the best time of `repeat` runs in seconds"""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def aggregate_minutes_elementwise(data: pd.DataFrame) -> dict[str, float]:
+    """Previous implementation of the reporter, parsing, rounding and formatting each element in python"""
+    data = data.assign(timestamp=data["timestamp"].apply(pd.Timestamp))
+    minutes = data.groupby(data["timestamp"].dt.floor("min"))["temperature"].mean()
+
+    full_range = pd.date_range(start=minutes.index.min(), end=minutes.index.max(), freq="min")
+    minutes = minutes.reindex(full_range, fill_value=0)
+
+    minutes.index = minutes.index.map(lambda timestamp: timestamp.isoformat())
+    minutes = minutes.apply(lambda temperature: round(temperature, 2))
+    return minutes.to_dict()
+
+
+def aggregate_minutes_vectorized(data: pd.DataFrame) -> dict[str, float]:
+    data = data.assign(timestamp=pd.to_datetime(data["timestamp"], format="ISO8601"))
+    return aggregate.aggregate_minutes(data)
+
+
+@click.command()
+@click.option("--size", default=1_000_000, type=int, help="Number of readings in the batch")
+@click.option("--hours", default=24, type=int, help="Time span of the batch in hours")
+@click.option("--repeat", default=3, type=int, help="Number of repeated runs, the best time is reported")
+@click.option("--windows", default="1min,5min,1h", help="Comma separated windows of the multi-window report")
+@click.option("--statistics", default="mean,min,max,count,p95", help="Comma separated statistics of the report")
+@click.option("--seed", default=42, type=int, help="Random seed")
+def main(size: int, hours: int, repeat: int, windows: str, statistics: str, seed: int):
+    rng = np.random.default_rng(seed)
+    offsets = pd.to_timedelta(np.sort(rng.integers(0, hours * 3600 * 10**6, size)), unit="us")
+    timestamps = pd.Timestamp("2025-01-01") + offsets
+
+    # batch as received from the event or csv with text timestamps, the same as written by the receiver
+    data = pd.DataFrame(
+        {"temperature": rng.uniform(-50, 150, size), "timestamp": timestamps.map(pd.Timestamp.isoformat)}
+    )
+    typed = data.assign(timestamp=timestamps)
+    spec = aggregate.AggregationSpec.from_dict({"REPORT_WINDOWS": windows, "REPORT_STATISTICS": statistics})
+
+    timings = {
+        "elementwise": benchmark(lambda: aggregate_minutes_elementwise(data), repeat),
+        "vectorized": benchmark(lambda: aggregate_minutes_vectorized(data), repeat),
+        "typed": benchmark(lambda: aggregate.aggregate_minutes(typed), repeat),  # parquet batch, no parsing
+        "report": benchmark(lambda: aggregate.aggregate(typed, spec), repeat),  # all windows and statistics
+    }
+
+    for name, seconds in timings.items():
+        print(f"{name:>12}: {seconds * 1000:10.2f} ms ({size / seconds / 1e6:8.2f} M readings/s)")
+
+
+if __name__ == "__main__":
+    main()
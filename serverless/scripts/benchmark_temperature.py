@@ -0,0 +1,41 @@
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+import click
+import numpy as np
+
+# sensor module is imported the same way as in the lambda function on AWS
+sys.path.append(str(Path(__file__).parents[1] / "src" / "sensor_lambda"))
+
+import sensor  # noqa: E402
+import vectorized  # noqa: E402
+
+
+def benchmark(function: Callable[[], Any], repeat: int) -> float:
+    """Returns the best time of `repeat` runs in seconds"""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+@click.command()
+@click.option("--size", default=1_000_000, type=int, help="Number of resistance readings to convert")
+@click.option("--repeat", default=5, type=int, help="Number of repeated runs, the best time is reported")
+@click.option("--seed", default=42, type=int, help="Random seed")
+def main(size: int, repeat: int, seed: int):
+    r = np.random.default_rng(seed).uniform(sensor.MIN_R, sensor.MAX_R, size)
+
+    scalar_size = min(size, 100_000)  # python loop is slow, so time is extrapolated from smaller sample
+    values = r[:scalar_size].tolist()
+    scalar = benchmark(lambda: [sensor.compute_temperature(value) for value in values], repeat)
+    timings = {
+        "scalar": scalar * size / scalar_size,
+        "vectorized": benchmark(lambda: vectorized.compute_temperatures(r), repeat),
+    }
+
+    for name, seconds in timings.items():
+        print(f"{name:>12}: {seconds * 1000:10.2f} ms ({size / seconds / 1e6:8.2f} M readings/s)")
+
+
+if __name__ == "__main__":
+    main()
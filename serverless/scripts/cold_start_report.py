@@ -0,0 +1,80 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import click
+
+LAMBDAS = ("sensor_lambda", "receiver_lambda", "reporter_lambda")
+SOURCE_PATH = Path(__file__).parents[1] / "src"
+
+# dummy environment, allowing to initialize each lambda module without AWS resources
+LAMBDA_ENV = {
+    "ENV": "local",
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "SENSOR_REGISTRY_TABLE": "sensor-registry",
+    "LAMBDA_IDEMPOTENCY_TABLE": "idempotency",
+    "SNS_TOPIC_ARN": "arn:aws:sns:us-east-1:123456789012:sensor-notifications",
+    "SQS_URL": "https://sqs.us-east-1.amazonaws.com/123456789012/sensor-queue",
+    "INPUT_BUCKET": "input-bucket",
+    "PAYLOAD_BUCKET": "payload-bucket",
+}
+
+# line of `python -X importtime` output: "import time:  self [us] | cumulative | imported package"
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure(lambda_name: str) -> dict[str, float]:
+    """
+    Import `main` module of the lambda in fresh interpreter and return the time in ms spent on each direct import
+    Time spent executing the module body itself (creating context, clients, logger etc.) is reported as `init`
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SOURCE_PATH / lambda_name,
+        env=os.environ | LAMBDA_ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if match := IMPORT_TIME_PATTERN.match(line):
+            self_us, cumulative_us, indent, name = match.groups()
+            if name == "main" and not indent:
+                timings["init"] = int(self_us) / 1000
+                timings["total"] = int(cumulative_us) / 1000
+            elif len(indent) == 2:  # direct import of the main module
+                timings[name] = int(cumulative_us) / 1000
+
+    return timings
+
+
+@click.command()
+@click.option("--repeat", default=5, type=int, help="Number of cold starts of each lambda, median is reported")
+@click.option("--top", default=8, type=int, help="Number of the slowest imports to report")
+def main(repeat: int, top: int):
+    for lambda_name in LAMBDAS:
+        runs = defaultdict(list)
+        for _ in range(repeat):
+            for name, milliseconds in measure(lambda_name).items():
+                runs[name].append(milliseconds)
+
+        medians = {name: statistics.median(values) for name, values in runs.items()}
+        total, init = medians.pop("total"), medians.pop("init")
+
+        print(f"{lambda_name}: {total:.1f} ms (median of {repeat} cold starts)")
+        for name, milliseconds in sorted(medians.items(), key=lambda item: -item[1])[:top]:
+            print(f"  import {name:<48} {milliseconds:8.1f} ms")
+        print(f"  {'init (module body)':<55} {init:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import dataclasses
+import sys
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import click
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pc
+import pyarrow.parquet as pq
+
+# sensor module is imported the same way as in the lambda function on AWS
+sys.path.append(str(Path(__file__).parents[1] / "src" / "sensor_lambda"))
+
+import sensor  # noqa: E402
+import vectorized  # noqa: E402
+
+COLUMNS = ["sensor_id", "location_id", "temperature", "status", "timestamp"]  # the same as messages sent to SQS
+
+
+@dataclasses.dataclass(frozen=True)
+class GeneratorConfig:
+    locations: int = 100
+    sensors: int = 10  # sensors in each location
+    start: str = "2025-01-01"
+    hours: float = 1.0  # time span of all readings
+    skew: float = 1.0  # exponent of Zipf distribution of readings between locations, 0 gives uniform rates
+    failure_rate: float = 0.01  # fraction of sensors failing at random time
+    spike_rate: float = 0.001  # fraction of readings with critical temperature
+    late_rate: float = 0.01  # fraction of readings arriving late, after readings with later timestamps
+    mean_delay_seconds: float = 60.0  # mean delay of late readings
+
+
+@dataclasses.dataclass(frozen=True)
+class Population:
+    """Properties of locations and sensors, drawn once for the whole dataset"""
+
+    location_weights: np.ndarray
+    baselines: np.ndarray  # mean temperature of each sensor
+    failures: np.ndarray  # offset of failure of each sensor in microseconds, infinite for working sensors
+
+    @classmethod
+    def draw(cls, config: GeneratorConfig, rng: np.random.Generator) -> "Population":
+        ranks = rng.permutation(config.locations) + 1  # busiest location is not always the first one
+        weights = 1 / ranks.astype(np.float64) ** config.skew
+
+        num_sensors = config.locations * config.sensors
+        location_temperatures = rng.uniform(40, 80, config.locations)
+        baselines = np.repeat(location_temperatures, config.sensors) + rng.normal(0, 2, num_sensors)
+
+        span = config.hours * 3600 * 10**6
+        failing = rng.random(num_sensors) < config.failure_rate
+        failures = np.where(failing, rng.uniform(0, span, num_sensors), np.inf)
+
+        return cls(weights / weights.sum(), baselines, failures)
+
+
+def generate(
+    rows: int, config: GeneratorConfig = GeneratorConfig(), chunk_size: int = 1_000_000, seed: int = 42
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields chunks of readings in order of arrival, each chunk covers the next interval of the time span
+    Readings of failed sensors are dropped by Sensor Lambda, so failed sensors go silent and chunks can be smaller
+    Output depends only on the arguments, so the same dataset is generated for the same seed
+    """
+    rng = np.random.default_rng(seed)
+    population = Population.draw(config, rng)
+    start = np.datetime64(pd.Timestamp(config.start), "us")
+    span = config.hours * 3600 * 10**6
+
+    for offset in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - offset)
+        arrivals = np.sort(rng.uniform(offset, offset + size, size)) * span / rows  # microseconds from the start
+
+        locations = rng.choice(config.locations, size=size, p=population.location_weights)
+        sensor_ids = locations * config.sensors + rng.integers(0, config.sensors, size)
+
+        temperatures = population.baselines[sensor_ids] + rng.normal(0, 1.5, size)
+        spikes = rng.random(size) < config.spike_rate
+        temperatures[spikes] = rng.uniform(sensor.TEMPERATURE_CRITICAL, sensor.TEMPERATURE_CRITICAL + 100, spikes.sum())
+
+        # late readings keep the time they were measured, but are placed by the time they arrived
+        late = rng.random(size) < config.late_rate
+        delays = np.where(late, rng.exponential(config.mean_delay_seconds * 10**6, size), 0)
+        measured = np.maximum(arrivals - delays, 0)
+
+        working = measured < population.failures[sensor_ids]
+        status_codes = vectorized.get_status_codes(temperatures[working])
+
+        yield pd.DataFrame(
+            {
+                "sensor_id": sensor_ids[working],
+                "location_id": locations[working] + 1,
+                "temperature": temperatures[working],
+                "status": np.array([status.value for status in sensor.STATUS_CODES])[status_codes],
+                "timestamp": start + measured[working].astype("timedelta64[us]"),
+            }
+        )
+
+
+def write_csv(chunks: Iterator[pd.DataFrame], path: str | Path) -> int:
+    """Write chunks to single CSV file with timestamps in ISO format as sent by Sensor Lambda, returns number of rows"""
+    options = pc.WriteOptions(include_header=False, quoting_style="none")  # pyarrow quotes the header otherwise
+
+    with open(path, "wb") as file:
+        file.write((",".join(COLUMNS) + "\n").encode("utf-8"))
+        return write_tables(
+            (
+                chunk.assign(timestamp=np.datetime_as_string(chunk["timestamp"].to_numpy(), unit="us"))
+                for chunk in chunks
+            ),
+            lambda schema: pc.CSVWriter(file, schema, write_options=options),
+        )
+
+
+def write_parquet(chunks: Iterator[pd.DataFrame], path: str | Path) -> int:
+    """Write chunks as row groups of single Parquet file with typed timestamps, returns number of rows"""
+    return write_tables(chunks, lambda schema: pq.ParquetWriter(path, schema, compression="zstd"))
+
+
+def write_tables(chunks: Iterator[pd.DataFrame], open_writer: Callable[[pa.Schema], Any]) -> int:
+    """Write chunks using pyarrow writer opened with schema of the first chunk, which is much faster than pandas"""
+    rows = 0
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        writer = writer or open_writer(table.schema)
+        writer.write_table(table)
+        rows += len(chunk)
+
+    if writer:
+        writer.close()
+    return rows
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet}
+
+
+@click.command()
+@click.option("--output", required=True, type=click.Path(), help="Path to the output file")
+@click.option("--format", "output_format", default="csv", type=click.Choice(list(WRITERS)), help="Output format")
+@click.option("--rows", default=1_000_000, type=int, help="Number of readings, before readings of failed sensors")
+@click.option("--locations", default=GeneratorConfig.locations, type=int, help="Number of locations")
+@click.option("--sensors", default=GeneratorConfig.sensors, type=int, help="Number of sensors in each location")
+@click.option("--start", default=GeneratorConfig.start, help="Time of the first reading")
+@click.option("--hours", default=GeneratorConfig.hours, type=float, help="Time span of the readings in hours")
+@click.option("--skew", default=GeneratorConfig.skew, type=float, help="Skew of rates of the locations")
+@click.option("--failure-rate", default=GeneratorConfig.failure_rate, type=float, help="Fraction of failing sensors")
+@click.option("--spike-rate", default=GeneratorConfig.spike_rate, type=float, help="Fraction of critical readings")
+@click.option("--late-rate", default=GeneratorConfig.late_rate, type=float, help="Fraction of late readings")
+@click.option("--mean-delay", default=GeneratorConfig.mean_delay_seconds, type=float, help="Mean delay in seconds")
+@click.option("--chunk-size", default=1_000_000, type=int, help="Number of readings generated at once")
+@click.option("--seed", default=42, type=int, help="Random seed")
+def main(
+    output: str,
+    output_format: str,
+    rows: int,
+    locations: int,
+    sensors: int,
+    start: str,
+    hours: float,
+    skew: float,
+    failure_rate: float,
+    spike_rate: float,
+    late_rate: float,
+    mean_delay: float,
+    chunk_size: int,
+    seed: int,
+):
+    config = GeneratorConfig(
+        locations, sensors, start, hours, skew, failure_rate, spike_rate, late_rate, mean_delay_seconds=mean_delay
+    )
+    written = WRITERS[output_format](generate(rows, config, chunk_size, seed), output)
+    print(f"Written {written} readings to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+SUMMARY_PERCENTILES = (50, 90, 99)
+TICKS_PER_HALF_DISTANCE = 5  # the same as default of HdrHistogram percentile distribution output
+
+
+class LatencyRecorder:
+    """
+    Client-side latency and outcome of each request, latencies are kept in seconds
+    `latency` is measured from sending the request and `response time` from the time the request was scheduled, which
+    includes waiting for free slot, so it is not hidden when the client is saturated (coordinated omission)
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.response_times = []
+        self.outcomes = Counter()
+
+    def record(self, outcome: str, latency: float, response_time: float | None = None):
+        self.outcomes[outcome] += 1
+        self.latencies.append(latency)
+        self.response_times.append(latency if response_time is None else response_time)
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def summary(self, elapsed: float) -> str:
+        lines = [
+            f"Completed {self.count} requests in {elapsed:.1f} s ({self.count / elapsed:.1f} rps)",
+            ", ".join(f"{outcome}: {self.outcomes[outcome]}" for outcome in ("ok", "throttled", "error")),
+        ]
+
+        for name, values in (("latency", self.latencies), ("response time", self.response_times)):
+            if not values:
+                continue
+
+            milliseconds = np.asarray(values) * 1000
+            percentiles = np.percentile(milliseconds, SUMMARY_PERCENTILES, method="higher")
+            reported = [f"p{p}={value:.1f}" for p, value in zip(SUMMARY_PERCENTILES, percentiles)]
+            lines.append(f"{name + ' [ms]':<20} " + " ".join(reported) + f" max={milliseconds.max():.1f}")
+
+        return "\n".join(lines)
+
+    def write_histogram(self, path: str | Path):
+        """Write percentile distribution of response times in milliseconds in HdrHistogram text format (`.hgrm`)"""
+        Path(path).write_text(percentile_distribution(np.asarray(self.response_times) * 1000))
+
+
+def percentile_levels(count: int) -> list[float]:
+    """Percentiles reported with fixed number of ticks in each half of the remaining distance to 100%"""
+    levels = []
+    half = 0
+    while True:
+        low, high = 100 * (1 - 0.5**half), 100 * (1 - 0.5 ** (half + 1))
+        levels.extend(low + (high - low) * tick / TICKS_PER_HALF_DISTANCE for tick in range(TICKS_PER_HALF_DISTANCE))
+
+        if 1 / (1 - high / 100) >= count:  # next levels are finer than single value
+            break
+        half += 1
+
+    return levels + [100.0]
+
+
+def percentile_distribution(values: np.ndarray) -> str:
+    if not len(values):
+        return ""
+
+    ordered = np.sort(values)
+    lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}", ""]
+
+    for level in percentile_levels(len(ordered)):
+        value = np.percentile(ordered, level, method="higher")
+        total = int(np.searchsorted(ordered, value, side="right"))
+        inverse = f"{1 / (1 - level / 100):14.2f}" if level < 100 else f"{'inf':>14}"
+        lines.append(f"{value:12.3f} {level / 100:14.12f} {total:10d} {inverse}")
+
+    lines.append(f"#[Mean    = {ordered.mean():12.3f}, StdDeviation   = {ordered.std():12.3f}]")
+    lines.append(f"#[Max     = {ordered.max():12.3f}, Total count    = {len(ordered):12d}]")
+    return "\n".join(lines) + "\n"
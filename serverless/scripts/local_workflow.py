@@ -0,0 +1,298 @@
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+import boto3
+import click
+import numpy as np
+import pandas as pd
+from moto import mock_aws
+
+ROOT_PATH = Path(__file__).parents[1]
+DEFINITION_PATH = ROOT_PATH / "infra" / "sensor-analytics-workflow.asl.json"
+# template variables of the definition are replaced with names of the local handlers
+FUNCTIONS = {"receiver_lambda_arn": "receiver_lambda", "reporter_lambda_arn": "reporter_lambda"}
+MAX_PAYLOAD_SIZE = 262144  # 256 KB -> hard limit of Step Functions state input and output
+MAX_INLINE_MAP_CONCURRENCY = 40  # inline Map runs at most 40 iterations at a time, also without MaxConcurrency
+
+# environment of the lambdas running against moto
+LAMBDA_ENV = {
+    "ENV": "local",
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "INPUT_BUCKET": "sfn-sensor-analytics-local",
+    "PAYLOAD_BUCKET": "sfn-payloads-local",
+    "SQS_URL": "https://sqs.us-east-1.amazonaws.com/123456789012/sensor-queue-local",
+    "SQS_WAIT_TIME_SECONDS": "1",
+}
+QUEUE_NAME = "sensor-queue-local"
+STATE_TABLE = "sensor-aggregates-local"
+
+LambdaContext = namedtuple(
+    "LambdaContext", ["function_name", "memory_limit_in_mb", "invoked_function_arn", "aws_request_id"]
+)
+
+
+class StatesError(Exception):
+    """Error raised by the state, `error` is the name matched by `ErrorEquals` of the retriers"""
+
+    def __init__(self, error: str, cause: str):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+def load_definition(path: Path = DEFINITION_PATH, functions: dict[str, str] = FUNCTIONS) -> dict:
+    """Load ASL definition, replacing template variables (as in terraform `templatefile`) with function names"""
+    definition = path.read_text()
+    for variable, name in functions.items():
+        definition = definition.replace(f"${{{variable}}}", name)
+    return json.loads(definition)
+
+
+def get_path(data: Any, path: str, context: dict) -> Any:
+    """Resolve reference path, only `$`, `$$` and fields separated by dots are supported, for example `$.batches`"""
+    root, *fields = path.split(".")
+    value = {"$": data, "$$": context}[root]
+    for field in fields:
+        value = value[field]
+    return value
+
+
+def resolve(parameters: Any, data: Any, context: dict) -> Any:
+    """Build the input from `Parameters` template, where keys ending with `.$` are paths in the input or context"""
+    if isinstance(parameters, dict):
+        return {
+            key.removesuffix(".$"): (
+                get_path(data, value, context) if key.endswith(".$") else resolve(value, data, context)
+            )
+            for key, value in parameters.items()
+        }
+    if isinstance(parameters, list):
+        return [resolve(value, data, context) for value in parameters]
+    return parameters
+
+
+def serialize(data: Any) -> Any:
+    """Round trip the data through JSON, as it is passed between the states, checking the size limit"""
+    encoded = json.dumps(data)
+    if len(encoded.encode("utf-8")) > MAX_PAYLOAD_SIZE:
+        raise StatesError("States.DataLimitExceeded", f"Payload of {len(encoded)} bytes exceeds the limit")
+    return json.loads(encoded)
+
+
+class Timings:
+    """Total time and number of executions of each state, shared by concurrent Map iterations"""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.executions = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            self.seconds[name] += seconds
+            self.executions[name] += 1
+
+    def report(self) -> str:
+        lines = [f"{'state':<24} {'executions':>10} {'total [s]':>10} {'mean [ms]':>10}"]
+        for name, seconds in self.seconds.items():
+            executions = self.executions[name]
+            lines.append(f"{name:<24} {executions:>10} {seconds:>10.3f} {seconds / executions * 1000:>10.2f}")
+        return "\n".join(lines)
+
+
+class LocalWorkflow:
+    """
+    Interpreter of ASL definition running lambda handlers in-process, supporting the subset of ASL used by the workflow:
+    `Task` states invoking lambda, `Map` states with `ItemsPath`, `Parameters` and `Iterator`, `Retry` of the tasks and
+    `InputPath` and `OutputPath` of all states
+    Map iterations run in thread pool, so handlers share the process and mocked AWS, as warm lambdas would
+    """
+
+    def __init__(self, definition: dict, handlers: dict[str, Callable], max_concurrency: int | None = None):
+        self.definition = definition
+        self.handlers = handlers
+        self.max_concurrency = max_concurrency
+        self.timings = Timings()
+
+    def run(self, data: Any) -> Any:
+        return self.execute(self.definition, serialize(data))
+
+    def execute(self, machine: dict, data: Any) -> Any:
+        name = machine["StartAt"]
+        while True:
+            state = machine["States"][name]
+
+            start = time.perf_counter()
+            data = self.run_state(state, data)
+            self.timings.add(name, time.perf_counter() - start)
+
+            if state.get("End"):
+                return data
+            name = state["Next"]
+
+    def run_state(self, state: dict, data: Any) -> Any:
+        data = get_path(data, state.get("InputPath", "$"), context={})
+
+        if state["Type"] == "Task":
+            result = self.retry(state, lambda: self.run_task(state, data))
+        elif state["Type"] == "Map":
+            result = self.run_map(state, data)
+        else:
+            raise NotImplementedError(f"State of type {state['Type']} is not supported!")
+
+        return serialize(get_path(result, state.get("OutputPath", "$"), context={}))
+
+    def run_task(self, state: dict, data: Any) -> dict:
+        if state["Resource"] != "arn:aws:states:::lambda:invoke":
+            raise NotImplementedError(f"Task resource {state['Resource']} is not supported!")
+
+        parameters = resolve(state["Parameters"], data, context={})
+        handler = self.handlers[parameters["FunctionName"]]
+        lambda_context = LambdaContext(parameters["FunctionName"], 1024, parameters["FunctionName"], str(uuid.uuid4()))
+
+        try:
+            payload = handler(serialize(parameters["Payload"]), lambda_context)
+        except Exception as error:  # lambda function error is reported with the name of the exception
+            raise StatesError(type(error).__name__, str(error)) from error
+
+        return {"StatusCode": 200, "Payload": payload}
+
+    @staticmethod
+    def retry(state: dict, task: Callable[[], Any]) -> Any:
+        """Run the task with retriers of the state, each retrier counts its own attempts"""
+        attempts = defaultdict(int)
+        while True:
+            try:
+                return task()
+            except StatesError as error:
+                retrier = next((retrier for retrier in state.get("Retry", []) if matches(retrier, error)), None)
+                index = state.get("Retry", []).index(retrier) if retrier else None
+
+                if retrier is None or attempts[index] >= retrier.get("MaxAttempts", 3):
+                    raise
+
+                interval = retrier.get("IntervalSeconds", 1) * retrier.get("BackoffRate", 2.0) ** attempts[index]
+                interval = min(interval, retrier.get("MaxDelaySeconds", interval))
+                if retrier.get("JitterStrategy") == "FULL":
+                    interval = random.uniform(0, interval)
+
+                attempts[index] += 1
+                time.sleep(interval)
+
+    def run_map(self, state: dict, data: Any) -> list:
+        items = get_path(data, state.get("ItemsPath", "$"), context={})
+        iterator = state.get("Iterator") or state["ItemProcessor"]
+        concurrency = self.max_concurrency or state.get("MaxConcurrency") or MAX_INLINE_MAP_CONCURRENCY
+
+        def iteration(index: int, item: Any) -> Any:
+            context = {"Map": {"Item": {"Index": index, "Value": item}}}
+            item_input = resolve(state["Parameters"], data, context) if "Parameters" in state else item
+            return self.execute(iterator, item_input)
+
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            return list(executor.map(iteration, range(len(items)), items))
+
+
+def matches(retrier: dict, error: StatesError) -> bool:
+    names = retrier["ErrorEquals"]
+    if "States.ALL" in names or error.error in names:
+        return True
+    return "States.TaskFailed" in names and not error.error.startswith("States.")
+
+
+def import_handlers() -> dict[str, Callable]:
+    """Import the handlers the same way as the tests, environment must be set before, since modules read it on import"""
+    sys.path.append(str(ROOT_PATH))
+    for name in FUNCTIONS.values():
+        sys.path.append(str(ROOT_PATH / "src" / name))
+
+    return {name: importlib.import_module(f"src.{name}.main").handler for name in FUNCTIONS.values()}
+
+
+def make_readings(rows: int, locations: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    timestamps = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 3600 * 10**6, rows), unit="us")
+    return pd.DataFrame(
+        {
+            "location_id": rng.integers(1, locations + 1, rows),
+            "temperature": rng.uniform(20, 250, rows),
+            "timestamp": timestamps.map(pd.Timestamp.isoformat),
+        }
+    )
+
+
+def prepare_input(source: str, readings: pd.DataFrame, state: bool) -> dict:
+    """Create mocked resources and put the readings into the input bucket or queue, returns the workflow input"""
+    s3 = boto3.client("s3", region_name=LAMBDA_ENV["AWS_REGION"])
+    s3.create_bucket(Bucket=LAMBDA_ENV["INPUT_BUCKET"])
+    s3.create_bucket(Bucket=LAMBDA_ENV["PAYLOAD_BUCKET"])
+
+    sqs = boto3.client("sqs", region_name=LAMBDA_ENV["AWS_REGION"])
+    queue_url = sqs.create_queue(QueueName=QUEUE_NAME)["QueueUrl"]
+
+    if state:
+        boto3.client("dynamodb", region_name=LAMBDA_ENV["AWS_REGION"]).create_table(
+            TableName=STATE_TABLE,
+            KeySchema=[
+                {"AttributeName": "location_id", "KeyType": "HASH"},
+                {"AttributeName": "hour", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "location_id", "AttributeType": "S"},
+                {"AttributeName": "hour", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    if source == "S3":
+        s3.put_object(Bucket=LAMBDA_ENV["INPUT_BUCKET"], Key="input.csv", Body=readings.to_csv(index=False).encode())
+        return {"source": source, "key": "input.csv"}
+
+    records = readings.to_dict("records")
+    for index in range(0, len(records), 10):
+        entries = [
+            {"Id": str(offset), "MessageBody": json.dumps(record)}
+            for offset, record in enumerate(records[index : index + 10])
+        ]
+        sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+    return {"source": source}
+
+
+@click.command()
+@click.option("--rows", default=100_000, type=int, help="Number of readings in the input")
+@click.option("--locations", default=100, type=int, help="Number of locations")
+@click.option("--source", default="S3", type=click.Choice(["S3", "SQS"]), help="Source of the input")
+@click.option("--concurrency", default=None, type=int, help="Map concurrency, as in definition or 40 by default")
+@click.option("--state/--no-state", default=False, help="Keep the state of the reporter in DynamoDB")
+@click.option("--seed", default=42, type=int, help="Random seed")
+def main(rows: int, locations: int, source: str, concurrency: int | None, state: bool, seed: int):
+    os.environ.update(LAMBDA_ENV | ({"REPORT_STATE_TABLE": STATE_TABLE} if state else {}))
+    os.environ.setdefault("SQS_DRAIN_MAX_MESSAGES", str(rows))
+
+    with mock_aws():
+        workflow_input = prepare_input(source, make_readings(rows, locations, seed), state)
+        workflow = LocalWorkflow(load_definition(), import_handlers(), max_concurrency=concurrency)
+
+        start = time.perf_counter()
+        output = workflow.run(workflow_input)
+        elapsed = time.perf_counter() - start
+
+    print(workflow.timings.report())
+    print(f"Processed {rows} readings in {len(output)} batches in {elapsed:.3f} s ({rows / elapsed:,.0f} readings/s)")
+
+
+if __name__ == "__main__":
+    main()
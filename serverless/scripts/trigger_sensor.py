@@ -1,36 +1,178 @@
+import asyncio
 import json
 import math
 import os
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import click
 import pandas as pd
 import yaml
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
+from latency import LatencyRecorder
 
-def invoke_lambda(payload: dict, client) -> dict:
+FUNCTION_NAME = "sensor-lambda"
+
+
+def make_payload(config: dict, rng: random.Random) -> dict:
+    location_id = rng.randrange(config["meta"]["locations"])
+    sensor_id = rng.randrange(config["meta"]["sensors"])
+    return {
+        "sensor_id": location_id * config["meta"]["sensors"] + sensor_id,  # unique sensor for each location
+        "location_id": location_id,
+        "value": rng.uniform(20, 250),
+    }
+
+
+def timed_invoke(client, payload: dict, invocation_type: str) -> tuple[str, float]:
+    """Returns the outcome and the latency in seconds, measured in the thread sending the request"""
+    start = time.perf_counter()
+    outcome, _ = invoke(client, payload, invocation_type)
+    return outcome, time.perf_counter() - start
+
+
+def invoke(client, payload: dict, invocation_type: str) -> tuple[str, dict | None]:
+    """
+    Invoke the lambda once without retries, returns the outcome: `ok`, `throttled` or `error` and the response
+    Asynchronous (`Event`) invocation only confirms the event was queued, so errors of the function are not seen and
+    there is no response
+    """
     try:
         raw_response = client.invoke(
-            FunctionName="sensor-lambda",
-            InvocationType="RequestResponse",
+            FunctionName=FUNCTION_NAME,
+            InvocationType=invocation_type,
             Payload=json.dumps(payload).encode("utf-8"),
         )
+    except ClientError as error:
+        return "throttled" if error.response["Error"]["Code"] == "TooManyRequestsException" else "error", None
+    except BotoCoreError:  # connection errors and timeouts
+        return "error", None
+
+    if invocation_type == "Event":
+        return "ok" if raw_response["StatusCode"] == 202 else "error", None
+
+    response = json.loads(raw_response["Payload"].read().decode("utf-8"))
+    if "FunctionError" in raw_response:
+        return "error", response
+
+    return "ok" if response.get("status_code") in (200, 204) else "error", response
+
+
+def arrivals(rps: float, arrival: str, rng: random.Random):
+    """Yields intervals between requests, exponential for Poisson arrivals and fixed for constant rate"""
+    while True:
+        yield rng.expovariate(rps) if arrival == "poisson" else 1 / rps
+
+
+async def report_progress(recorder: LatencyRecorder, in_flight: list[int], interval: float):
+    """Print throughput of the last interval, until cancelled"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    completed = 0
+
+    while True:
+        await asyncio.sleep(interval)
+        rps = (recorder.count - completed) / interval
+        completed = recorder.count
+        print(f"[{loop.time() - start:6.1f} s] {completed} completed, {rps:.1f} rps, {in_flight[0]} in flight")
+
+
+async def generate_load(
+    client,
+    config: dict,
+    rps: float,
+    duration: float,
+    concurrency: int,
+    arrival: str,
+    invocation_type: str,
+    seed: int,
+    report_interval: float,
+) -> LatencyRecorder:
+    """
+    Open-loop load: requests are sent at scheduled times independent of responses, up to `concurrency` in flight
+    When all slots are taken, the request waits for the free one and is sent late, so the achieved rate drops below
+    the target instead of hiding the saturation and the waiting is included in the response time
+    """
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    in_flight = [0]
+    recorder = LatencyRecorder()
+
+    async def send(payload: dict, scheduled: float, executor: ThreadPoolExecutor):
+        in_flight[0] += 1
+        try:
+            outcome, latency = await loop.run_in_executor(executor, timed_invoke, client, payload, invocation_type)
+            recorder.record(outcome, latency, response_time=loop.time() - scheduled)
+        finally:
+            in_flight[0] -= 1
+            slots.release()
+
+    progress = asyncio.create_task(report_progress(recorder, in_flight, report_interval))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        tasks = []
+        start = scheduled = loop.time()
+
+        for interval in arrivals(rps, arrival, rng):
+            scheduled += interval
+            if scheduled > start + duration:
+                break
+
+            await asyncio.sleep(max(scheduled - loop.time(), 0))
+            await slots.acquire()
+            tasks.append(asyncio.create_task(send(make_payload(config, rng), scheduled, executor)))
+
+        await asyncio.gather(*tasks)
+
+    progress.cancel()
+    return recorder
+
+
+def run_sequential(client, config: dict, dump: str | None, report_interval: float) -> LatencyRecorder:
+    """
+    Closed-loop run: single request at a time with random delay after each response
+    Failed requests are counted by outcome and the run goes on, progress is printed every `report_interval` seconds
+    """
+    recorder = LatencyRecorder()
+    max_requests = math.ceil(config["timer"]["total_runtime_seconds"] / config["timer"]["min_delay_seconds"])
+    data_dump = []
+    rng = random.Random()
 
-        response_payload = raw_response["Payload"].read().decode("utf-8")
-        response = json.loads(response_payload)
+    start = reported = time.time()
+    completed = 0
+    for n in range(max_requests):
+        elapsed = time.time() - start
+        if elapsed > config["timer"]["total_runtime_seconds"]:
+            print(f"Exit loop after {config['timer']['total_runtime_seconds']} seconds")
+            break
 
-        status_code = response.get("status_code")
-        if status_code in (200, 204):
-            return response["body"]
+        sent = time.perf_counter()
+        outcome, response = invoke(client, make_payload(config, rng), "RequestResponse")
+        recorder.record(outcome, time.perf_counter() - sent)
+        if outcome != "ok":
+            print(f"Request {n} failed with outcome {outcome}: {response}")
+        elif dump:
+            data_dump.append({**json.loads(response.get("body", "{}")), "n": n})  # ignored events have no body
+
+        if time.time() - reported >= report_interval:
+            rps = (recorder.count - completed) / (time.time() - reported)
+            reported, completed = time.time(), recorder.count
+            failed = recorder.count - recorder.outcomes["ok"]
+            print(f"[{reported - start:6.1f} s] {completed} completed, {rps:.1f} rps, {failed} failed")
+
+        interval = random.uniform(config["timer"]["min_delay_seconds"], config["timer"]["max_delay_seconds"])
+        time.sleep(interval)
+    else:
+        print(f"Exiting after {max_requests} triggers")
 
-        print(f"Got unexpected status: {status_code}!")
-        raise RuntimeError(response)
+    if dump:
+        pd.DataFrame(data_dump).to_csv(dump)
 
-    except Exception as e:
-        print(f"Error invoking Lambda: {e}")
-        raise e
+    return recorder
 
 
 @click.command()
@@ -47,44 +189,57 @@ def invoke_lambda(payload: dict, client) -> dict:
     default=None,
     help="Path to CSV with data dump",
 )
-def main(config: str, dump: bool):
+@click.option("--rps", default=None, type=float, help="Target requests per second, enables concurrent load mode")
+@click.option("--arrival", default="poisson", type=click.Choice(["poisson", "constant"]), help="Arrival process")
+@click.option("--concurrency", default=64, type=int, help="Maximum number of requests in flight in load mode")
+@click.option(
+    "--invocation-type",
+    default="RequestResponse",
+    type=click.Choice(["RequestResponse", "Event"]),
+    help="Synchronous or asynchronous invocation in load mode",
+)
+@click.option("--seed", default=None, type=int, help="Random seed of the load")
+@click.option("--report-interval", default=1.0, type=float, help="Interval of live throughput reports")
+@click.option(
+    "--histogram",
+    required=False,
+    type=click.Path(),
+    default=None,
+    help="Path to file with percentile distribution of response times in HdrHistogram format",
+)
+def main(
+    config: str,
+    dump: str | None,
+    rps: float | None,
+    arrival: str,
+    concurrency: int,
+    invocation_type: str,
+    seed: int | None,
+    report_interval: float,
+    histogram: str | None,
+):
     session = boto3.Session(profile_name=os.environ["AWS_PROFILE_NAME"], region_name="us-east-1")
-    client = session.client("lambda")
 
     with open(config, "r") as f:
         config = yaml.safe_load(f)
 
-    max_requests = math.ceil(config["timer"]["total_runtime_seconds"] / config["timer"]["min_delay_seconds"])
-    data_dump = []
-
-    start = time.time()
-    for n in range(max_requests):
-        elapsed = time.time() - start
-        if elapsed > config["timer"]["total_runtime_seconds"]:
-            print(f"Exit loop after {config['timer']['total_runtime_seconds']} seconds")
-            break
-
-        location_id = random.choice(list(range(config["meta"]["locations"])))
-        sensor_id = random.choice(list(range(config["meta"]["sensors"])))
-        payload = {
-            "sensor_id": location_id * config["meta"]["sensors"] + sensor_id,  # unique sensor for each location
-            "location_id": location_id,
-            "value": random.uniform(20, 250),
-        }
-
-        response = invoke_lambda(payload, client=client)
-        print(response)
-        if dump:
-            response.update({"n": n})
-            data_dump.append(response)
-
-        interval = random.uniform(config["timer"]["min_delay_seconds"], config["timer"]["min_delay_seconds"])
-        time.sleep(interval)
+    start = time.perf_counter()
+    if rps is None:
+        recorder = run_sequential(session.client("lambda"), config, dump, report_interval)
     else:
-        print(f"Exiting after {max_requests} triggers")
+        # connection pool is sized for all requests in flight and throttling is reported instead of retried
+        retries = {"total_max_attempts": 1, "mode": "standard"}
+        client = session.client("lambda", config=Config(max_pool_connections=concurrency, retries=retries))
+        duration = config["timer"]["total_runtime_seconds"]
 
-    if dump:
-        pd.DataFrame(data_dump).to_csv(dump)
+        load = generate_load(
+            client, config, rps, duration, concurrency, arrival, invocation_type, seed, report_interval
+        )
+        recorder = asyncio.run(load)
+
+    print(recorder.summary(elapsed=time.perf_counter() - start))
+    if histogram:
+        recorder.write_histogram(histogram)
 
 
 if __name__ == "__main__":
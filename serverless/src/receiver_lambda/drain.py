@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Final
+
+import retry
+
+# limit of SQS ReceiveMessage and DeleteMessageBatch
+MAX_SQS_BATCH: Final[int] = 10
+
+
+class Budget:
+    """Budget of messages and time shared by concurrent receivers"""
+
+    def __init__(self, max_messages: int, max_seconds: float):
+        self.remaining = max_messages
+        self.deadline = time.monotonic() + max_seconds
+        self.lock = threading.Lock()
+
+    def reserve(self, size: int) -> int:
+        """Reserve up to `size` messages, returns 0 when the budget is exhausted"""
+        with self.lock:
+            if time.monotonic() >= self.deadline:
+                return 0
+
+            reserved = min(size, self.remaining)
+            self.remaining -= reserved
+            return reserved
+
+    def release(self, size: int):
+        with self.lock:
+            self.remaining += size
+
+
+def receive(sqs_client: Any, sqs_url: str, budget: Budget, wait_time_seconds: int, visibility_timeout: int) -> list:
+    """Receive messages until the budget is exhausted or long polling returns nothing, which means queue is drained"""
+    messages = []
+    while size := budget.reserve(MAX_SQS_BATCH):
+        response = sqs_client.receive_message(
+            QueueUrl=sqs_url,
+            MaxNumberOfMessages=size,
+            WaitTimeSeconds=wait_time_seconds,
+            VisibilityTimeout=visibility_timeout,
+        )
+
+        received = response.get("Messages", [])
+        budget.release(size - len(received))
+        messages.extend(received)
+
+        if not received:
+            break
+
+    return messages
+
+
+def drain(
+    sqs_client: Any,
+    sqs_url: str,
+    max_messages: int,
+    max_seconds: float,
+    workers: int,
+    wait_time_seconds: int,
+    visibility_timeout: int,
+) -> list[dict]:
+    """
+    Drain the queue using concurrent long polling receivers, within the budget of messages and time
+    Messages are not deleted, they stay invisible for `visibility_timeout` and must be deleted using `delete`
+    SQS delivers messages at least once, so the same message can be received twice with different receipt handles,
+    all received messages are returned, so each of the handles is deleted, use `unique` to get messages for the payload
+    """
+    budget = Budget(max_messages, max_seconds)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(receive, sqs_client, sqs_url, budget, wait_time_seconds, visibility_timeout)
+            for _ in range(workers)
+        ]
+        return [message for future in futures for message in future.result()]
+
+
+def unique(messages: list[dict]) -> list[dict]:
+    """Messages with distinct `MessageId`, keeping the first received copy of each message"""
+    first = {}
+    for message in messages:
+        first.setdefault(message["MessageId"], message)
+    return list(first.values())
+
+
+def delete_batch(sqs_client: Any, sqs_url: str, messages: list[dict]) -> int:
+    """
+    Delete up to 10 messages, retrying only failed entries, which are not caused by the sender
+    Returns the number of messages, which failed to be deleted
+    """
+    entries = [{"Id": str(index), "ReceiptHandle": message["ReceiptHandle"]} for index, message in enumerate(messages)]
+    sender_faults = 0
+
+    def attempt(entries: list[dict]) -> list[dict]:
+        nonlocal sender_faults
+        response = sqs_client.delete_message_batch(QueueUrl=sqs_url, Entries=entries)
+        failed = response.get("Failed", [])
+        sender_faults += sum(failure["SenderFault"] for failure in failed)  # e.g. invalid receipt handle
+
+        retried = {failure["Id"] for failure in failed if not failure["SenderFault"]}
+        return [entry for entry in entries if entry["Id"] in retried]
+
+    remaining = retry.with_backoff(attempt, entries)
+    return sender_faults + len(remaining)
+
+
+def delete(sqs_client: Any, sqs_url: str, messages: list[dict], workers: int) -> int:
+    """Delete messages using concurrent DeleteMessageBatch calls in groups of 10, returns the number of failures"""
+    batches = [messages[index : index + MAX_SQS_BATCH] for index in range(0, len(messages), MAX_SQS_BATCH)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(lambda batch: delete_batch(sqs_client, sqs_url, batch), batches))
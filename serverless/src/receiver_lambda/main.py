@@ -1,13 +1,15 @@
 import enum
 import json
 import os
+import uuid
 
 import awswrangler as wr
 import pandas as pd
 from aws_lambda_powertools import Logger
 
-from typing import Any
-
+import drain
+import planner
+import spill
 from receiver import Context
 
 
@@ -16,44 +18,53 @@ context = Context.from_dict(dict(os.environ))
 
 MAX_PAYLOAD_SIZE = 262144  # 256 KB -> hard limit from Step Functions
 BUFFER = int(0.1 * MAX_PAYLOAD_SIZE)  # 10% buffer to be safe
+# lower bound of serialized record size
+MIN_RECORD_SIZE = len(json.dumps({"location_id": 0, "temperature": 0, "timestamp": ""}))
 
 
 class Source(enum.StrEnum):
     s3 = "S3"
+    s3_parquet = "S3_PARQUET"
     sqs = "SQS"
     event = "EVENT"
 
 
-def receive_message(sqs_url: str, sqs_client: Any) -> list:
-    messages = []
-    while True:
-        response = sqs_client.receive_message(
-            QueueUrl=sqs_url,
-            MaxNumberOfMessages=10,
-            WaitTimeSeconds=0,
-        )
+def receive_messages() -> list[dict]:
+    """Drain messages from SQS, messages are not deleted and must be deleted after the payload is handed off"""
+    return drain.drain(
+        context.sqs_client,
+        context.sqs_url,
+        max_messages=context.drain_max_messages,
+        max_seconds=context.drain_max_seconds,
+        workers=context.drain_workers,
+        wait_time_seconds=context.wait_time_seconds,
+        visibility_timeout=context.visibility_timeout,
+    )
 
-        if "Messages" not in response:
-            break
-        for message in response["Messages"]:
-            messages.append(json.loads(message["Body"]))
-            context.sqs_client.delete_message(QueueUrl=sqs_url, ReceiptHandle=message["ReceiptHandle"])
-        if len(response["Messages"]) < 10:
-            break
 
-    return messages
+def delete_messages(messages: list[dict]):
+    failed = drain.delete(context.sqs_client, context.sqs_url, messages, workers=context.drain_workers)
+    if failed:
+        logger.warning(f"Failed to delete {failed} messages from SQS, they will be received again")
 
 
 @logger.inject_lambda_context(log_event=True)
-def handler(event, _):
+def handler(event, lambda_context):
+    messages = []
+
+    if event["source"] == Source.s3.value and context.read_chunk_size > 0:
+        logger.info("Received event from S3, streaming in chunks")
+        return stream_s3_input(event["key"], execution_id=lambda_context.aws_request_id)
+
     if event["source"] == Source.s3.value:
         logger.info("Received event from S3")
         data = wr.s3.read_csv(f"s3://{context.input_bucket}/{event['key']}")
 
     elif event["source"] == Source.sqs.value:
-        messages = receive_message(context.sqs_url, context.sqs_client)
-        logger.info(f"Received {len(messages)} messages from SQS")
-        data = pd.DataFrame(messages)
+        messages = receive_messages()  # all received copies are deleted, but each message is processed once
+        unique = drain.unique(messages)
+        logger.info(f"Received {len(unique)} messages from SQS ({len(messages) - len(unique)} duplicates)")
+        data = pd.DataFrame([json.loads(message["Body"]) for message in unique])
     else:
         logger.error(f"Unknown source: {event['source']}")
         raise RuntimeError(f"Unknown source: {event['source']}")
@@ -62,26 +73,142 @@ def handler(event, _):
         logger.warning(f"Did not receive any data from {event['source']}")
         return {"status_code": 204}
 
-    grouped = data.groupby("location_id")
+    payload = make_payload(data, execution_id=lambda_context.aws_request_id)
+
+    if messages:  # messages are deleted only after the payload is ready to be handed off
+        delete_messages(messages)
+
+    return payload
+
+
+def is_packed() -> bool:
+    """Packed batches can contain multiple locations, so the reporter returns the report of each location"""
+    return context.batch_target_rows > 0
+
+
+def make_batches(data: pd.DataFrame) -> list[pd.DataFrame]:
+    """Single batch for each location, or locations packed into batches of target size, when it is set"""
+    if context.batch_target_rows > 0:
+        return planner.plan_batches(data, context.batch_target_rows, context.batch_split_window)
+    return [group for _, group in data.groupby("location_id")]
 
-    batches = [group[["temperature", "timestamp"]] for _, group in grouped]
+
+def make_payload(data: pd.DataFrame, execution_id: str | None = None) -> dict:
+    """
+    Build the payload with batches of locations, when it fits into Step Functions limit, spill to S3 otherwise
+    The size is estimated incrementally, batch by batch, so only the records fitting into the limit are kept as dicts
+    """
+    execution_id = execution_id or str(uuid.uuid4())
+    batches = make_batches(data)
     logger.info(f"Created {len(batches)} batches")
 
-    json_batches = [batch.to_dict("records") for batch in batches]
-    payload = {
-        "status_code": 200,
-        "source": Source.event.value,
-        "batches": json_batches,
-    }
+    if len(data) * MIN_RECORD_SIZE > MAX_PAYLOAD_SIZE - BUFFER:  # can not fit, even if each record is minimal
+        return spill_batches(batches, execution_id)
+
+    payload = {"status_code": 200, "source": Source.event.value, "packed": is_packed(), "batches": []}
     payload_size = len(json.dumps(payload).encode("utf-8"))
 
-    if payload_size > (MAX_PAYLOAD_SIZE - BUFFER):
-        s3_keys = []
-        for index, batch in enumerate(batches):  # write batches to S3, each as a CSV file
-            path = f"s3://{context.payload_bucket}/batch-{index}.csv"
-            wr.s3.to_csv(batch, path)
-            s3_keys.append(path)
+    for batch in batches:
+        records = batch[["location_id", "temperature", "timestamp"]].to_dict("records")
+        payload_size += len(json.dumps(records).encode("utf-8")) + len(", ")  # separator between batches
+
+        if payload_size > (MAX_PAYLOAD_SIZE - BUFFER):
+            return spill_batches(batches, execution_id)
+
+        payload["batches"].append(records)
+
+    return payload
+
 
-        payload = {"status_code": 200, "batches": s3_keys, "source": Source.s3.value}
+def spill_batches(batches: list[pd.DataFrame], execution_id: str) -> dict:
+    """Batches are uploaded under prefix scoped to the execution, so concurrent executions never overwrite each other"""
+    spill_format = spill.SpillFormat(context.spill_format)
+    logger.info(f"Payload exceeds the limit, writing batches to S3 as {spill_format}")
+
+    manifest = spill.upload_batches(
+        context.s3_client,
+        context.payload_bucket,
+        prefix=execution_id,
+        batches=batches,
+        spill_format=spill_format,
+        workers=context.upload_workers,
+    )
+
+    return make_spill_payload([batch["path"] for batch in manifest], manifest, spill_format, execution_id)
+
+
+def stream_s3_input(key: str, execution_id: str) -> dict:
+    """
+    Read the input in chunks and spill location groups to S3, keeping memory usage bounded for any input size
+    Location can be uploaded as multiple parts, so each batch is the prefix with all parts of single location
+    """
+    spill_format = spill.SpillFormat(context.spill_format)
+    spiller = spill.LocationSpiller(
+        context.s3_client,
+        context.payload_bucket,
+        prefix=execution_id,
+        spill_format=spill_format,
+        workers=context.upload_workers,
+        buffer_rows=context.stream_buffer_rows,
+    )
+
+    for chunk in wr.s3.read_csv(f"s3://{context.input_bucket}/{key}", chunksize=context.read_chunk_size):
+        spiller.add(chunk)
+
+    locations = spiller.close()
+    logger.info(f"Streamed {len(locations)} locations from S3")
+
+    if not locations:
+        logger.warning("Did not receive any data from S3")
+        return {"status_code": 204}
+
+    if is_packed():
+        paths = pack_streamed_locations(locations, spill_format, execution_id)
+    else:
+        # number of parts grows with the number of flushes, so the batch is the prefix with all parts of the location
+        paths = [spill.location_prefix(parts) for parts in locations]
+
+    return make_spill_payload(paths, [part for parts in locations for part in parts], spill_format, execution_id)
+
+
+def pack_streamed_locations(
+    locations: list[list[dict]], spill_format: spill.SpillFormat, execution_id: str
+) -> list[str]:
+    """
+    Pack streamed locations into batches of about target size, each batch is passed as manifest listing its parts, so
+    the payload grows with the number of batches only
+    Parts are cut by the flushes of the buffer, not at the window boundaries, so locations are never split
+    """
+    batches = planner.pack([sum(part["rows"] for part in parts) for parts in locations], context.batch_target_rows)
+    logger.info(f"Packed {len(locations)} streamed locations into {len(batches)} batches")
+
+    return spill.write_batch_manifests(
+        context.s3_client,
+        context.payload_bucket,
+        prefix=execution_id,
+        spill_format=spill_format,
+        batches=[[part for index in batch for part in locations[index]] for batch in batches],
+        workers=context.upload_workers,
+    )
+
+
+def make_spill_payload(
+    batches: list[str],
+    manifest: list[dict],
+    spill_format: spill.SpillFormat,
+    execution_id: str,
+) -> dict:
+    source = Source.s3 if spill_format == spill.SpillFormat.csv else Source.s3_parquet
+    payload = {"status_code": 200, "batches": batches, "source": source.value, "packed": is_packed()}
+    if len(json.dumps(payload).encode("utf-8")) > MAX_PAYLOAD_SIZE - BUFFER:
+        # fails here with clear reason, instead of failing the state with `States.DataLimitExceeded`
+        raise RuntimeError(
+            f"Payload with paths of {len(batches)} batches exceeds the Step Functions limit, set BATCH_TARGET_ROWS!"
+        )
+
+    if context.spill_manifest:
+        payload["manifest"] = spill.write_manifest(
+            context.s3_client, context.payload_bucket, execution_id, spill_format, manifest
+        )
 
     return payload
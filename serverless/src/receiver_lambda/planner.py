@@ -0,0 +1,55 @@
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def split_location(group: pd.DataFrame, target_rows: int, split_window: str) -> list[pd.DataFrame]:
+    """
+    Split readings of single location into parts of about `target_rows` rows, cut only at the window boundaries, so
+    all readings of each window are in the same part and the statistics of the window stay correct
+    Window starting at k-th multiple of `target_rows` readings goes to k-th part, so part can exceed the target by the
+    size of its last window
+    """
+    windows = pd.to_datetime(group["timestamp"], format="ISO8601").dt.floor(split_window).to_numpy()
+    order = np.argsort(windows, kind="stable")
+    windows = windows[order]
+
+    _, counts = np.unique(windows, return_counts=True)  # rows in each window, in order of windows
+    parts = (np.cumsum(counts) - counts) // target_rows
+    part_of_row = np.repeat(parts, counts)
+
+    group = group.iloc[order]
+    return [group[part_of_row == part] for part in np.unique(parts)]
+
+
+def plan_batches(data: pd.DataFrame, target_rows: int, split_window: str) -> list[pd.DataFrame]:
+    """
+    Pack locations into batches of about `target_rows` rows, locations larger than the target are split into parts
+    Parts are assigned from the largest one to the least loaded batch, which keeps the batches even, so the slowest
+    batch does not decide the time of the whole Map state
+    """
+    parts = []
+    for _, group in data.groupby("location_id"):
+        parts.extend(split_location(group, target_rows, split_window) if len(group) > target_rows else [group])
+
+    batches = pack([len(part) for part in parts], target_rows)
+    return [pd.concat([parts[index] for index in batch]) for batch in batches]
+
+
+def pack(sizes: list[int], target_rows: int) -> list[list[int]]:
+    """
+    Assign items of given sizes to batches of about `target_rows` rows, returns indices of the items in each batch
+    Items are assigned from the largest one to the least loaded batch, empty batches are dropped
+    """
+    num_batches = max(math.ceil(sum(sizes) / target_rows), 1)
+    loads = [(0, index) for index in range(num_batches)]
+    batches = [[] for _ in range(num_batches)]
+
+    for item in sorted(range(len(sizes)), key=lambda item: sizes[item], reverse=True):
+        rows, index = heapq.heappop(loads)
+        batches[index].append(item)
+        heapq.heappush(loads, (rows + sizes[item], index))
+
+    return [batch for batch in batches if batch]
@@ -1,7 +1,9 @@
 import dataclasses
+import functools
 from typing import Any, Self
 
 import boto3
+import pandas as pd
 
 
 @dataclasses.dataclass
@@ -9,21 +11,68 @@ class Context:
     sqs_url: str
     input_bucket: str
     payload_bucket: str
+    spill_format: str
+    spill_manifest: bool
+    upload_workers: int
+
+    # packing of locations into batches of target size, one batch for each location when target is 0
+    # locations are split at the largest window of the report, so no window of the report spans two batches
+    batch_target_rows: int
+    batch_split_window: str
+
+    # streaming of S3 input, disabled when chunk size is 0
+    read_chunk_size: int
+    stream_buffer_rows: int
 
     aws_region: str
 
-    sqs_client: Any
-    s3_client: Any
+    # budget and concurrency of draining messages from SQS
+    drain_max_messages: int
+    drain_max_seconds: float
+    drain_workers: int
+    wait_time_seconds: int
+    visibility_timeout: int
+
+    # clients are created on first use and cached, so they are shared between warm invocations
+    @functools.cached_property
+    def sqs_client(self) -> Any:
+        return boto3.client("sqs", region_name=self.aws_region)
+
+    @functools.cached_property
+    def s3_client(self) -> Any:
+        return boto3.client("s3", region_name=self.aws_region)
 
     @classmethod
     def from_dict(cls, env: dict) -> Self:
-        aws_region = env["AWS_REGION"]
-
         return cls(
             sqs_url=env["SQS_URL"],
             input_bucket=env["INPUT_BUCKET"],
             payload_bucket=env["PAYLOAD_BUCKET"],
-            aws_region=aws_region,
-            sqs_client=boto3.client("sqs", region_name=aws_region),
-            s3_client=boto3.client("s3", region_name=aws_region),
+            spill_format=env.get("SPILL_FORMAT", "parquet"),
+            spill_manifest=env.get("SPILL_MANIFEST", "false").lower() == "true",
+            upload_workers=int(env.get("S3_UPLOAD_WORKERS", 8)),
+            batch_target_rows=int(env.get("BATCH_TARGET_ROWS", 0)),
+            batch_split_window=largest_window(env.get("BATCH_SPLIT_WINDOW", "1min"), env.get("REPORT_WINDOWS", "")),
+            read_chunk_size=int(env.get("S3_READ_CHUNK_SIZE", 0)),
+            stream_buffer_rows=int(env.get("S3_STREAM_BUFFER_ROWS", 1_000_000)),
+            aws_region=env["AWS_REGION"],
+            drain_max_messages=int(env.get("SQS_DRAIN_MAX_MESSAGES", 100_000)),
+            drain_max_seconds=float(env.get("SQS_DRAIN_MAX_SECONDS", 20)),
+            drain_workers=int(env.get("SQS_DRAIN_WORKERS", 8)),
+            wait_time_seconds=int(env.get("SQS_WAIT_TIME_SECONDS", 2)),
+            # messages must stay invisible until the payload is handed off and they are deleted
+            visibility_timeout=int(env.get("SQS_VISIBILITY_TIMEOUT_SECONDS", 120)),
         )
+
+
+def largest_window(split_window: str, report_windows: str) -> str:
+    """
+    Largest of the split window and comma separated windows of the report, given as pandas frequency strings
+    Boundaries of the largest window must be boundaries of all the other windows, so it must be their multiple
+    """
+    windows = [split_window] + [window.strip() for window in report_windows.split(",") if window.strip()]
+    largest = max(windows, key=pd.to_timedelta)
+    for window in windows:
+        if pd.to_timedelta(largest) % pd.to_timedelta(window):
+            raise ValueError(f"Window {largest} used to split locations is not multiple of window {window}!")
+    return largest
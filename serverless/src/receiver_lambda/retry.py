@@ -0,0 +1,25 @@
+import random
+import time
+from typing import Callable, Final, TypeVar
+
+# retries use exponential backoff with full jitter, so clients throttled at the same time do not retry together
+MAX_ATTEMPTS: Final[int] = 5
+BACKOFF_BASE_SECONDS: Final[float] = 0.05
+
+Pending = TypeVar("Pending")
+
+
+def with_backoff(attempt: Callable[[Pending], Pending], pending: Pending, max_attempts: int = MAX_ATTEMPTS) -> Pending:
+    """
+    Call `attempt` with the pending requests, which returns the requests to retry, until none is left or attempts are
+    exhausted, returns the requests still pending after the last attempt
+    """
+    for index in range(max_attempts):
+        if not pending:
+            break
+
+        if index > 0:
+            time.sleep(random.uniform(0, BACKOFF_BASE_SECONDS * 2 ** (index - 1)))
+        pending = attempt(pending)
+
+    return pending
@@ -0,0 +1,170 @@
+import collections
+import enum
+import io
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Hashable
+
+import pandas as pd
+
+
+class SpillFormat(enum.StrEnum):
+    csv = "csv"
+    parquet = "parquet"
+
+
+def serialize_csv(group: pd.DataFrame) -> bytes:
+    return group[["location_id", "temperature", "timestamp"]].to_csv(index=False).encode("utf-8")
+
+
+def serialize_parquet(group: pd.DataFrame) -> bytes:
+    """Parquet batch has typed timestamp column, so the reporter does not need to parse it again"""
+    batch = pd.DataFrame(
+        {
+            "location_id": group["location_id"].astype(str).astype("category"),  # dictionary encoded
+            "temperature": group["temperature"],
+            # parsed the same way as by the reporter, so timezone aware timestamps are accepted as well
+            "timestamp": pd.to_datetime(group["timestamp"], format="ISO8601").dt.as_unit("us"),
+        }
+    )
+
+    buffer = io.BytesIO()
+    batch.to_parquet(buffer, index=False, compression="zstd")
+    return buffer.getvalue()
+
+
+SERIALIZERS = {SpillFormat.csv: serialize_csv, SpillFormat.parquet: serialize_parquet}
+
+
+def upload_batch(
+    s3_client: Any,
+    bucket: str,
+    prefix: str,
+    spill_format: SpillFormat,
+    index: int,
+    group: pd.DataFrame,
+) -> dict:
+    """
+    Upload single batch under the prefix partitioned by location, or under `packed` partition when batch contains more
+    than single location, returns the manifest entry of the batch
+    """
+    location_ids = sorted(map(str, group["location_id"].unique()))
+    partition = f"location_id={location_ids[0]}" if len(location_ids) == 1 else "packed"
+
+    key = f"{prefix}/{partition}/batch-{index}.{spill_format}"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=SERIALIZERS[spill_format](group))
+    return {"path": f"s3://{bucket}/{key}", "location_ids": location_ids, "rows": len(group)}
+
+
+def upload_batches(
+    s3_client: Any,
+    bucket: str,
+    prefix: str,
+    batches: list[pd.DataFrame],
+    spill_format: SpillFormat,
+    workers: int,
+) -> list[dict]:
+    """
+    Upload each batch using thread pool sharing single S3 client, which is thread-safe
+    Returns manifest entries of the batches in the order of batches
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(upload_batch, s3_client, bucket, prefix, spill_format, index, batch)
+            for index, batch in enumerate(batches)
+        ]
+        return [future.result() for future in futures]
+
+
+class LocationSpiller:
+    """
+    Spill streamed chunks of data, grouped by location, keeping at most `buffer_rows` rows buffered in memory
+    Locations missing in the latest chunk are assumed to be finished and are uploaded right away, all buffered
+    locations are uploaded when the buffer is full, so single location can be uploaded as multiple parts
+    At most `workers` uploads are pending, adding chunks waits for the oldest upload when reading outpaces uploading
+    """
+
+    def __init__(
+        self,
+        s3_client: Any,
+        bucket: str,
+        prefix: str,
+        spill_format: SpillFormat,
+        workers: int,
+        buffer_rows: int,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.spill_format = spill_format
+        self.buffer_rows = buffer_rows
+
+        self.buffers: dict[Hashable, list[pd.DataFrame]] = collections.defaultdict(list)
+        self.buffered = 0
+        self.parts: dict[Hashable, list[Future]] = collections.defaultdict(list)
+        self.num_parts = 0
+        self.workers = workers
+        self.pending: collections.deque[Future] = collections.deque()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def add(self, chunk: pd.DataFrame):
+        seen = set()
+        for location_id, group in chunk.groupby("location_id"):
+            self.buffers[location_id].append(group)
+            seen.add(location_id)
+        self.buffered += len(chunk)
+
+        if self.buffered > self.buffer_rows:
+            self.flush(list(self.buffers))
+        else:
+            self.flush([location_id for location_id in self.buffers if location_id not in seen])
+
+    def flush(self, location_ids: list[Hashable]):
+        for location_id in location_ids:
+            group = pd.concat(self.buffers.pop(location_id))
+            self.buffered -= len(group)
+
+            future = self.executor.submit(
+                upload_batch, self.s3_client, self.bucket, self.prefix, self.spill_format, self.num_parts, group
+            )
+            self.parts[location_id].append(future)
+            self.pending.append(future)
+            self.num_parts += 1
+
+            while len(self.pending) > self.workers:  # uploaded groups are released, so memory stays bounded
+                self.pending.popleft().result()
+
+    def close(self) -> list[list[dict]]:
+        """
+        Upload remaining buffers and return manifest entries of all parts for each location, sorted by location
+        All parts of the location are uploaded under its partition, given by `location_prefix`
+        """
+        self.flush(list(self.buffers))
+        self.executor.shutdown(wait=True)
+
+        return [[part.result() for part in self.parts[location_id]] for location_id in sorted(self.parts)]
+
+
+def location_prefix(parts: list[dict]) -> str:
+    """Prefix of the partition with all parts of single location, trailing slash excludes other locations"""
+    return parts[0]["path"].rsplit("/", 1)[0] + "/"
+
+
+def write_manifest(s3_client: Any, bucket: str, prefix: str, spill_format: SpillFormat, batches: list[dict]) -> str:
+    key = f"{prefix}/manifest.json"
+    manifest = {"format": spill_format.value, "batches": batches}
+
+    s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(manifest).encode("utf-8"))
+    return f"s3://{bucket}/{key}"
+
+
+def write_batch_manifests(
+    s3_client: Any, bucket: str, prefix: str, spill_format: SpillFormat, batches: list[list[dict]], workers: int
+) -> list[str]:
+    """Write manifest with the parts of each batch under `batches/<index>` prefix, returns paths of the manifests"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(write_manifest, s3_client, bucket, f"{prefix}/batches/{index}", spill_format, parts)
+            for index, parts in enumerate(batches)
+        ]
+        return [future.result() for future in futures]
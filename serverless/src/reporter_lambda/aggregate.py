@@ -0,0 +1,175 @@
+import dataclasses
+import re
+from typing import Final, Self
+
+import numpy as np
+import pandas as pd
+
+STATISTICS: Final[tuple[str, ...]] = ("mean", "min", "max", "count")
+PERCENTILE_PATTERN = re.compile(r"p(\d{1,2}(\.\d+)?)")  # for example p95 or p99.9
+MICROSECONDS: Final[np.timedelta64] = np.timedelta64(1, "us")
+
+
+@dataclasses.dataclass
+class AggregationSpec:
+    """Windows given as pandas frequency strings (for example `1min` or `1h`) and statistics computed in each window"""
+
+    windows: list[str]
+    statistics: list[str]
+
+    def __post_init__(self):
+        for statistic in self.statistics:
+            if statistic not in STATISTICS and not PERCENTILE_PATTERN.fullmatch(statistic):
+                raise ValueError(f"Unknown statistic {statistic}, expected one of {STATISTICS} or percentile pNN!")
+
+        for window in self.windows:
+            if pd.to_timedelta(window) < pd.Timedelta(seconds=1):
+                raise ValueError(f"Window {window} is shorter than 1 second!")
+
+    @classmethod
+    def from_dict(cls, env: dict) -> Self:
+        return cls(
+            windows=[window.strip() for window in env.get("REPORT_WINDOWS", "").split(",") if window.strip()],
+            statistics=[statistic.strip() for statistic in env.get("REPORT_STATISTICS", "mean").split(",")],
+        )
+
+
+def to_microseconds(timestamps: pd.Series) -> np.ndarray:
+    return timestamps.to_numpy().astype("datetime64[us]").astype(np.int64)
+
+
+def window_statistics(timestamps: np.ndarray, temperatures: np.ndarray, window: str, statistics: list[str]) -> dict:
+    """
+    Compute statistics of the readings in each window between the first and the last reading
+    Timestamps are given in microseconds and temperatures must be sorted ascending, so the readings sorted by window
+    with stable sort are ordered by temperature within each window and order statistics are read by position
+    Returns columns of the statistics with `timestamp` of the window start, windows without readings have count 0 and
+    other statistics set to NaN
+    """
+    window_us = pd.to_timedelta(window) // pd.Timedelta(microseconds=1)
+    bins = timestamps // window_us  # floor, aligned to the epoch
+    start = bins.min()
+    offsets = bins - start
+
+    counts = np.bincount(offsets)
+    present = counts > 0
+    labels = (start + np.arange(len(counts))) * window_us * MICROSECONDS + np.datetime64(0, "us")
+    columns = {"timestamp": np.datetime_as_string(labels, unit="s")}
+
+    if "count" in statistics:
+        columns["count"] = counts
+
+    if "mean" in statistics:
+        sums = np.bincount(offsets, weights=temperatures, minlength=len(counts))
+        columns["mean"] = np.divide(sums, counts, out=np.full(len(counts), np.nan), where=present)
+
+    if any(statistic != "mean" and statistic != "count" for statistic in statistics):
+        ordered = temperatures[np.argsort(offsets, kind="stable")]
+        ends = np.cumsum(counts)
+        starts = np.minimum(ends - counts, len(ordered) - 1)  # windows without readings point to any valid position
+
+        for statistic in statistics:
+            if statistic == "min":
+                values = ordered[starts]
+            elif statistic == "max":
+                values = ordered[np.maximum(ends - 1, 0)]
+            elif match := PERCENTILE_PATTERN.fullmatch(statistic):
+                # linear interpolation between the closest ranks, the same as numpy default
+                position = starts + float(match.group(1)) / 100 * np.maximum(counts - 1, 0)
+                lower = np.floor(position).astype(np.int64)
+                upper = np.minimum(lower + 1, np.maximum(ends - 1, 0))
+                values = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+            else:
+                continue
+
+            columns[statistic] = np.where(present, values, np.nan)
+
+    return columns
+
+
+def prepare(data: pd.DataFrame, sort: bool) -> tuple[np.ndarray, np.ndarray]:
+    """Returns timestamps in microseconds and temperatures of valid readings, sorted by temperature if requested"""
+    data = data.dropna(subset=["temperature"])
+    timestamps = to_microseconds(data["timestamp"])
+    temperatures = data["temperature"].to_numpy(dtype=np.float64)
+
+    if sort:
+        order = np.argsort(temperatures, kind="stable")
+        return timestamps[order], temperatures[order]
+    return timestamps, temperatures
+
+
+def minute_partials(data: pd.DataFrame) -> pd.DataFrame:
+    """Sum and count of temperatures in each location and minute, which can be merged with partials of other batches"""
+    data = data.dropna(subset=["temperature"])
+    keys = {
+        "location_id": data["location_id"].astype(str).to_numpy(),
+        "minute": np.datetime_as_string(data["timestamp"].to_numpy().astype("datetime64[m]"), unit="s"),
+    }
+
+    grouped = pd.DataFrame(keys | {"temperature": data["temperature"].to_numpy(dtype=np.float64)}).groupby(
+        ["location_id", "minute"], sort=False
+    )
+    return grouped["temperature"].agg(["sum", "count"]).reset_index()
+
+
+def aggregate_minutes(data: pd.DataFrame, fill_gaps: bool = True) -> dict[str, float]:
+    """
+    Compute mean temperature in each minute between the first and the last reading, minutes without readings are 0
+    or are skipped, when `fill_gaps` is False
+    Readings are binned by the offset in minutes from the first one, so the whole batch is aggregated in bulk
+    """
+    timestamps, temperatures = prepare(data, sort=False)
+    if not len(timestamps):
+        return {}
+
+    columns = window_statistics(timestamps, temperatures, "1min", ["mean"])
+    labels, means = columns["timestamp"], columns["mean"]
+    if not fill_gaps:
+        labels, means = labels[~np.isnan(means)], means[~np.isnan(means)]
+
+    return dict(zip(labels.tolist(), np.round(np.nan_to_num(means, nan=0.0), 2).tolist()))
+
+
+def aggregate_locations(data: pd.DataFrame) -> dict[str, dict[str, float]]:
+    """
+    Compute mean temperature in each minute with readings of each location in the batch
+    All locations are aggregated together, so the cost does not depend on the number of locations
+    """
+    partials = minute_partials(data).sort_values(["location_id", "minute"])
+    means = np.round(partials["sum"].to_numpy() / partials["count"].to_numpy(), 2)
+
+    report = {}
+    for location_id, minute, mean in zip(partials["location_id"].tolist(), partials["minute"].tolist(), means.tolist()):
+        report.setdefault(location_id, {})[minute] = mean
+    return report
+
+
+def aggregate(data: pd.DataFrame, spec: AggregationSpec) -> dict[str, dict[str, list]]:
+    """
+    Compute all windows of the spec from single copy of the batch, which is sorted by temperature at most once
+    Returns columns of each window, where windows without readings are marked with `None` (and count 0)
+    """
+    timestamps, temperatures = prepare(
+        data, sort=any(statistic not in ("mean", "count") for statistic in spec.statistics)
+    )
+    if not len(timestamps):
+        return {window: {} for window in spec.windows}
+
+    report = {}
+    for window in spec.windows:
+        columns = window_statistics(timestamps, temperatures, window, spec.statistics)
+
+        output = {"timestamp": columns.pop("timestamp").tolist()}
+        for statistic, values in columns.items():
+            if statistic == "count":
+                output[statistic] = values.tolist()
+                continue
+
+            output[statistic] = np.round(values, 2).tolist()
+            for gap in np.flatnonzero(np.isnan(values)):  # NaN is not valid JSON
+                output[statistic][gap] = None
+
+        report[window] = output
+
+    return report
@@ -1,14 +1,23 @@
 import enum
+import json
+import os
 
 import awswrangler as wr
 import pandas as pd
 from aws_lambda_powertools import Logger
 
+from aggregate import AggregationSpec, aggregate, aggregate_locations, aggregate_minutes, minute_partials
+from reporter import Context
+from state import AggregateStateClient, batch_id
+
 logger = Logger("receiver_lambda")
+context = Context.from_dict(dict(os.environ))
+spec = AggregationSpec.from_dict(dict(os.environ))
 
 
 class Source(enum.StrEnum):
     s3 = "S3"
+    s3_parquet = "S3_PARQUET"
     event = "EVENT"
 
 
@@ -17,27 +26,75 @@ def event_to_message(event: dict) -> dict:
     return {k: v for k, v in event.items() if k != "batch"}
 
 
-@logger.inject_lambda_context(log_event=True)
-def handler(event: dict, _):
-    logger.info(f"Received event from {event_to_message(event)}")
+def batch_paths(batch: str | list[str]) -> str | list[str]:
+    """Packed batch of streamed input is given as manifest, which lists the parts of its locations"""
+    if not isinstance(batch, str) or not batch.endswith("/manifest.json"):
+        return batch
+
+    bucket, key = batch.removeprefix("s3://").split("/", 1)
+    manifest = json.loads(context.s3_client.get_object(Bucket=bucket, Key=key)["Body"].read())
+    return [part["path"] for part in manifest["batches"]]
+
+
+def read_batch(event: dict) -> pd.DataFrame:
+    """Read the batch with typed timestamp column, parquet batches are already typed and only text is parsed"""
+    if event["source"] == Source.s3_parquet.value:
+        return wr.s3.read_parquet(batch_paths(event["batch"]), columns=["location_id", "temperature", "timestamp"])
 
     if event["source"] == Source.s3.value:
-        data = wr.s3.read_csv(event["batch"])
+        data = wr.s3.read_csv(batch_paths(event["batch"]))
     elif event["source"] == Source.event.value:
         data = pd.DataFrame(event["batch"])
     else:
         raise ValueError(f"Can't parse from event {event_to_message(event)}!")
 
-    data["timestamp"] = data["timestamp"].apply(pd.Timestamp)
-    minutes = data.groupby(data["timestamp"].dt.floor("min"))["temperature"].mean()
+    data["timestamp"] = pd.to_datetime(data["timestamp"], format="ISO8601")
+    return data
+
+
+def merge_state(data: pd.DataFrame, batch: str):
+    """Merge partial aggregates of the batch into the state, so the state is updated only with the new readings"""
+    if "location_id" not in data.columns:
+        raise ValueError("Batch without `location_id` can not be merged into the state!")
+
+    state = AggregateStateClient(
+        context.dynamodb_client,
+        context.state_table,
+        workers=context.state_workers,
+        ttl_seconds=context.state_ttl_seconds,
+    )
+    merged = state.merge(minute_partials(data), batch)
+    logger.info(f"Merged {merged} minutes of batch {batch} into the state")
 
-    start_time = minutes.index.min()
-    end_time = minutes.index.max()
 
-    full_range = pd.date_range(start=start_time, end=end_time, freq="min")
-    minutes = minutes.reindex(full_range, fill_value=0)
+def report(data: pd.DataFrame) -> dict:
+    if spec.windows:
+        return aggregate(data, spec)
+
+    # mean in each minute with gaps filled with 0, when no windows are configured
+    return aggregate_minutes(data)
+
+
+def report_locations(data: pd.DataFrame) -> dict[str, dict]:
+    """Location can be split into multiple batches, so minutes without readings are skipped instead of filled"""
+    if spec.windows:
+        return {
+            str(location_id): aggregate(group, spec)
+            for location_id, group in data.groupby("location_id", observed=True)
+        }
+
+    return aggregate_locations(data)
+
+
+@logger.inject_lambda_context(log_event=True)
+def handler(event: dict, _):
+    logger.info(f"Received event from {event_to_message(event)}")
+
+    data = read_batch(event)
+    if context.state_table:
+        merge_state(data, batch_id(event["batch"]))
 
-    minutes.index = minutes.index.map(lambda timestamp: timestamp.isoformat())
-    minutes = minutes.apply(lambda temperature: round(temperature, 2))
+    if event.get("packed", False):
+        return report_locations(data)
 
-    return minutes.to_dict()
+    return report(data)
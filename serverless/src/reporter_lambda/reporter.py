@@ -0,0 +1,34 @@
+import dataclasses
+import functools
+from typing import Any, Self
+
+import boto3
+
+
+@dataclasses.dataclass
+class Context:
+    # table with partial aggregates of each location and minute, state is not kept when not set
+    state_table: str | None
+    state_workers: int
+    state_ttl_seconds: float
+
+    aws_region: str
+
+    # clients are created on first use and cached, so they are shared between warm invocations
+    @functools.cached_property
+    def dynamodb_client(self) -> Any:
+        return boto3.client("dynamodb", region_name=self.aws_region)
+
+    @functools.cached_property
+    def s3_client(self) -> Any:
+        return boto3.client("s3", region_name=self.aws_region)
+
+    @classmethod
+    def from_dict(cls, env: dict) -> Self:
+        return cls(
+            state_table=env.get("REPORT_STATE_TABLE") or None,
+            state_workers=int(env.get("REPORT_STATE_WORKERS", 8)),
+            # items of the state expire after the late readings of the hour are not expected anymore
+            state_ttl_seconds=float(env.get("REPORT_STATE_TTL_HOURS", 48)) * 3600,
+            aws_region=env.get("AWS_REGION", "us-east-1"),
+        )
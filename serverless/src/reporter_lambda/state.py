@@ -0,0 +1,81 @@
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+
+def batch_id(batch: Any) -> str:
+    """Batch is identified by its content (records or S3 paths), so retried invocation has the same identifier"""
+    return hashlib.sha256(json.dumps(batch, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+class AggregateStateClient:
+    """
+    Partial aggregates (sum and count of temperatures) of each location and minute, stored in DynamoDB table with
+    `location_id` as hash key and `hour` as range key, item keeps `sum_<MM>` and `count_<MM>` of each minute of the hour
+    Partials are added with atomic ADD, so concurrent batches and late readings update the same minute correctly, and
+    each item keeps the set of merged batches, so the batch retried after partial failure is not added twice
+    Single item for each hour cuts the number of writes up to 60 times, items expire `ttl_seconds` after the last
+    update, so the set of merged batches does not grow without bound
+    """
+
+    def __init__(self, client: Any, table_name: str, workers: int, ttl_seconds: float):
+        self.client = client
+        self.table_name = table_name
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+
+    def add(
+        self, location_id: str, hour: str, minutes: dict[str, tuple[float, int]], batch: str, expires_at: int
+    ) -> bool:
+        """Add sum and count of minutes of the hour keyed by `MM`, returns False when the batch was already merged"""
+        names, values = {}, {}
+        for index, (minute, (total, count)) in enumerate(minutes.items()):
+            names |= {f"#sum{index}": f"sum_{minute}", f"#count{index}": f"count_{minute}"}
+            values |= {f":sum{index}": {"N": repr(total)}, f":count{index}": {"N": str(count)}}
+
+        additions = ", ".join(f"#sum{index} :sum{index}, #count{index} :count{index}" for index in range(len(minutes)))
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={"location_id": {"S": location_id}, "hour": {"S": hour}},
+                UpdateExpression=f"ADD {additions}, batches :batches SET expires_at = :expires_at",
+                ConditionExpression="attribute_not_exists(batches) OR NOT contains(batches, :batch)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+                | {
+                    ":batches": {"SS": [batch]},
+                    ":batch": {"S": batch},
+                    ":expires_at": {"N": str(expires_at)},
+                },
+            )
+            return True
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def merge(self, partials: pd.DataFrame, batch: str) -> int:
+        """Merge partials with `location_id`, `minute`, `sum` and `count` columns, returns number of merged minutes"""
+        hours = {}
+        for location_id, minute, total, count in zip(
+            partials["location_id"].astype(str).tolist(),
+            partials["minute"].tolist(),
+            partials["sum"].tolist(),
+            partials["count"].tolist(),
+        ):
+            # minute is given as `YYYY-MM-DDTHH:MM:00`
+            hours.setdefault((location_id, f"{minute[:13]}:00:00"), {})[minute[14:16]] = (total, count)
+
+        expires_at = int(time.time() + self.ttl_seconds)
+
+        def add(item: tuple[tuple[str, str], dict]) -> int:
+            (location_id, hour), minutes = item
+            return len(minutes) if self.add(location_id, hour, minutes, batch, expires_at) else 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return sum(executor.map(add, hours.items()))
@@ -0,0 +1,40 @@
+import collections
+import time
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    Bounded in-process cache evicting least recently used entries, with optional TTL for each entry
+    Meant to be created on module initialization, to be reused between warm invocations of the Lambda
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries: collections.OrderedDict[Hashable, tuple[Any, float]] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Returns cached value or None, when the key is not cached or its entry has expired"""
+        if key not in self.entries:
+            return None
+
+        value, expires_at = self.entries[key]
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, expires: bool = True):
+        """Cache the value, entries put with `expires=False` are kept until evicted"""
+        expires_at = time.monotonic() + self.ttl_seconds if expires else float("inf")
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
@@ -1,6 +1,37 @@
+import time
+from typing import Callable, Final, Iterator
+
 import boto3
 from botocore.exceptions import ClientError
 
+import retry
+from cache import LRUCache
+
+# limits of DynamoDB batch operations
+MAX_BATCH_GET_KEYS: Final[int] = 100
+MAX_BATCH_WRITE_ITEMS: Final[int] = 25
+
+
+def chunks(items: list, size: int) -> Iterator[list]:
+    for index in range(0, len(items), size):
+        yield items[index : index + size]
+
+
+def batch_with_retries(operation: Callable, request_items: dict, unprocessed_key: str) -> list[dict]:
+    """
+    Run DynamoDB batch operation, retrying unprocessed keys or items until all of them are processed
+    Returns response of each attempt, raises RuntimeError when attempts are exhausted
+    """
+    responses = []
+
+    def attempt(items: dict) -> dict | None:
+        responses.append(operation(RequestItems=items))
+        return responses[-1].get(unprocessed_key)
+
+    if retry.with_backoff(attempt, request_items):
+        raise RuntimeError(f"DynamoDB batch operation has unprocessed requests after {retry.MAX_ATTEMPTS} attempts!")
+    return responses
+
 
 class SensorRegistryClient:
     def __init__(self, client: "boto3.client.dynamodb", table_name: str):
@@ -16,7 +47,7 @@ class SensorRegistryClient:
     def get_item(self, sensor_id: str) -> dict:
         response = self.client.get_item(TableName=self.table_name, Key={"sensor_id": {"S": sensor_id}})
         item = response.get("Item", {})
-        return {k: (v["S"] if "S" in v else v["BOOL"]) for k, v in item.items()}
+        return {k: (v["S"] if "S" in v else float(v["N"]) if "N" in v else v["BOOL"]) for k, v in item.items()}
 
     def update_item(self, sensor_id: str, working_ok: bool):
         self.client.update_item(
@@ -26,6 +57,96 @@ class SensorRegistryClient:
             ExpressionAttributeValues={":w": {"BOOL": working_ok}},
         )
 
+    def register(self, sensor_id: str) -> bool:
+        """
+        Register the sensor as working, if it is not in the registry yet, and return its `working_ok` status
+        Single conditional update replaces `exists`, `put_item` and `get_item` calls
+        Existing status is never overwritten, so sensor marked as broken stays broken
+        """
+        response = self.client.update_item(
+            TableName=self.table_name,
+            Key={"sensor_id": {"S": sensor_id}},
+            UpdateExpression="set working_ok = if_not_exists(working_ok, :w)",
+            ExpressionAttributeValues={":w": {"BOOL": True}},
+            ReturnValues="ALL_NEW",
+        )
+        return response["Attributes"]["working_ok"]["BOOL"]
+
+    def open_alert_window(self, sensor_id: str, location_id: str, window_seconds: float, readings: int) -> int | None:
+        """
+        Open alert suppression window for the sensor at the location, returns the number of critical readings suppressed
+        within the previous window, or None when the window is already open and the readings are suppressed
+        Conditional update makes sure only one of the concurrent Lambdas sends the alert in each window
+        Windows of each location are kept in separate attributes of the registry item, so locations never suppress
+        alerts of each other
+        """
+        now = time.time()
+        names = {"#until": f"alert_until_{location_id}", "#suppressed": f"alert_suppressed_{location_id}"}
+        try:
+            response = self.client.update_item(
+                TableName=self.table_name,
+                Key={"sensor_id": {"S": sensor_id}},
+                UpdateExpression="set #until = :until, #suppressed = :zero",
+                ConditionExpression="attribute_not_exists(#until) OR #until < :now",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues={
+                    ":until": {"N": str(now + window_seconds)},
+                    ":now": {"N": str(now)},
+                    ":zero": {"N": "0"},
+                },
+                ReturnValues="UPDATED_OLD",
+            )
+            suppressed = response.get("Attributes", {}).get(names["#suppressed"], {"N": "0"})
+            return int(suppressed["N"])
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+        # readings suppressed within the window are reported with the alert opening the next window
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={"sensor_id": {"S": sensor_id}},
+            UpdateExpression="ADD #suppressed :readings",
+            ExpressionAttributeNames={"#suppressed": names["#suppressed"]},
+            ExpressionAttributeValues={":readings": {"N": str(readings)}},
+        )
+        return None
+
+    def get_items(self, sensor_ids: list[str]) -> dict[str, bool]:
+        """
+        Resolve `working_ok` status of many sensors using BatchGetItem in chunks of 100 keys
+        Sensors missing in the registry are not present in the returned mapping
+        """
+        statuses = {}
+        for chunk in chunks(list(dict.fromkeys(sensor_ids)), MAX_BATCH_GET_KEYS):  # duplicated keys are rejected
+            request_items = {
+                self.table_name: {
+                    "Keys": [{"sensor_id": {"S": sensor_id}} for sensor_id in chunk],
+                    "ProjectionExpression": "sensor_id, working_ok",
+                }
+            }
+
+            for response in batch_with_retries(self.client.batch_get_item, request_items, "UnprocessedKeys"):
+                for item in response["Responses"].get(self.table_name, []):
+                    statuses[item["sensor_id"]["S"]] = item["working_ok"]["BOOL"]
+
+        return statuses
+
+    def put_items(self, sensor_ids: list[str], working_ok: bool):
+        """
+        Write many sensors using BatchWriteItem in chunks of 25 items
+        Batch writes are unconditional, so it should not be used to register sensors concurrently with other writers
+        """
+        for chunk in chunks(list(dict.fromkeys(sensor_ids)), MAX_BATCH_WRITE_ITEMS):
+            request_items = {
+                self.table_name: [
+                    {"PutRequest": {"Item": {"sensor_id": {"S": sensor_id}, "working_ok": {"BOOL": working_ok}}}}
+                    for sensor_id in chunk
+                ]
+            }
+
+            batch_with_retries(self.client.batch_write_item, request_items, "UnprocessedItems")
+
     def exists(self, sensor_id: str) -> bool:
         try:
             response = self.client.get_item(
@@ -36,3 +157,50 @@ class SensorRegistryClient:
             return "Item" in response
         except ClientError:  # sensor_id not found - avoid scan
             return False
+
+
+class CachedSensorRegistryClient(SensorRegistryClient):
+    """
+    Registry client answering `working_ok` lookups from in-process cache shared between warm invocations
+    Sensors never change from broken to working, so broken sensors are cached without expiry
+    Working sensors expire after cache TTL, which bounds the delay of seeing sensor marked broken by other Lambda
+    """
+
+    def __init__(self, client: "boto3.client.dynamodb", table_name: str, cache: LRUCache):
+        super().__init__(client, table_name)
+        self.cache = cache
+
+    def remember(self, sensor_id: str, working_ok: bool):
+        self.cache.put(sensor_id, working_ok, expires=working_ok)
+
+    def put_item(self, sensor_id: str, working_ok: bool):
+        super().put_item(sensor_id, working_ok)
+        self.remember(sensor_id, working_ok)
+
+    def update_item(self, sensor_id: str, working_ok: bool):
+        super().update_item(sensor_id, working_ok)
+        self.remember(sensor_id, working_ok)
+
+    def register(self, sensor_id: str) -> bool:
+        working_ok = self.cache.get(sensor_id)
+        if working_ok is None:
+            working_ok = super().register(sensor_id)
+            self.remember(sensor_id, working_ok)
+
+        return working_ok
+
+    def get_items(self, sensor_ids: list[str]) -> dict[str, bool]:
+        statuses = {sensor_id: self.cache.get(sensor_id) for sensor_id in sensor_ids}
+        statuses = {sensor_id: working_ok for sensor_id, working_ok in statuses.items() if working_ok is not None}
+
+        missing = [sensor_id for sensor_id in sensor_ids if sensor_id not in statuses]
+        fetched = super().get_items(missing) if missing else {}
+        for sensor_id, working_ok in fetched.items():
+            self.remember(sensor_id, working_ok)
+
+        return statuses | fetched
+
+    def put_items(self, sensor_ids: list[str], working_ok: bool):
+        super().put_items(sensor_ids, working_ok)
+        for sensor_id in sensor_ids:
+            self.remember(sensor_id, working_ok)
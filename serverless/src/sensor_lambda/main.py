@@ -1,59 +1,229 @@
+import base64
+import collections
+import functools
 import json
 import os
 from datetime import datetime as dt
+from typing import Callable
 
+import cache
 import dynamodb
 import sensor
 import sns
 import sqs
 from aws_lambda_powertools import Logger
-from aws_lambda_powertools.utilities.idempotency import DynamoDBPersistenceLayer, idempotent
+from aws_lambda_powertools.utilities.idempotency import (
+    DynamoDBPersistenceLayer,
+    IdempotencyConfig,
+    idempotent_function,
+)
 
 
 logger = Logger("sensor_lambda")
 context = sensor.Context.from_dict(dict(os.environ))
-persistence_store = DynamoDBPersistenceLayer(table_name=context.idempotency_table)
+# completed executions are kept in memory, so duplicates delivered to warm Lambda do not reach DynamoDB
+idempotency_config = IdempotencyConfig(
+    use_local_cache=context.idempotency_local_cache_size > 0,
+    local_cache_max_items=max(context.idempotency_local_cache_size, 1),
+)
+registry_cache = cache.LRUCache(context.registry_cache_size, context.registry_cache_ttl_seconds)
 
 
 @logger.inject_lambda_context(log_event=True)
-@idempotent(persistence_store=persistence_store)
-def handler(event, _):
-    main(event)
+def handler(event, lambda_context):
+    idempotency_config.register_lambda_context(lambda_context)
+    return idempotent_main()(key=idempotency_key(event), event=event)
 
 
-def main(event: dict):
+@functools.cache
+def persistence_store() -> DynamoDBPersistenceLayer:
+    """
+    Idempotency layer shares DynamoDB client with the registry, instead of creating its own
+    It is created on first invocation, since creating the persistence layer creates the client
+    """
+    return DynamoDBPersistenceLayer(table_name=context.idempotency_table, boto3_client=context.dynamodb)
+
+
+@functools.cache
+def idempotent_main() -> Callable[..., dict]:
+    """Main logic wrapped with idempotency, `key` is hashed by the idempotency layer"""
+
+    @idempotent_function(data_keyword_argument="key", persistence_store=persistence_store(), config=idempotency_config)
+    def wrapped(key: dict, event: dict | list) -> dict:
+        return main(event)
+
+    return wrapped
+
+
+def idempotency_key(event: dict | list) -> dict:
+    """
+    Idempotency key is narrowed to the configured fields of each reading, whole event is used when not configured
+    Batch envelopes are unpacked, so the same readings delivered again in different envelope are recognized
+    Reading missing any of the fields is used whole, otherwise all such readings of the sensor would share the key
+    """
+    if not context.idempotency_key_fields:
+        return {"event": event}
+
+    readings = unpack_batch(event) if is_batch(event) else [event]
+    return {"readings": [reading_key(reading) for reading in readings]}
+
+
+def reading_key(reading: dict) -> dict:
+    missing = [field for field in context.idempotency_key_fields if field not in reading]
+    if missing:
+        logger.warning(f"Reading is missing idempotency key fields {missing}, using the whole reading as the key")
+        return reading
+
+    return {field: reading[field] for field in context.idempotency_key_fields}
+
+
+def is_batch(event: dict | list) -> bool:
+    """Batch events are either plain JSON arrays of readings or SQS / Kinesis style envelopes with `Records` key"""
+    return isinstance(event, list) or "Records" in event
+
+
+def unpack_record(record: dict) -> dict:
+    """Unpack single reading from SQS (JSON `body`) or Kinesis (base64 encoded `data`) record"""
+    if "body" in record:
+        return json.loads(record["body"])
+    if "kinesis" in record:
+        return json.loads(base64.b64decode(record["kinesis"]["data"]))
+    return record  # record is the reading itself
+
+
+def unpack_batch(event: dict | list) -> list[dict]:
+    if isinstance(event, list):
+        return event
+    return [unpack_record(record) for record in event["Records"]]
+
+
+def main(event: dict | list) -> dict:
     """
     Main logic of the Lambda handler, unwrapped from the AWS Lambda specific settings (idempotency, logger etc.)
     `context` is initialized on module initialization, to be reused between execution environments.
+
+    Event can be a single reading or a batch of readings, for batches the result is returned for each reading.
     """
     logger.info(f"Received event: {event}")
-    sensor_registry = dynamodb.SensorRegistryClient(context.dynamodb, table_name=context.sensor_registry_table)
+    sensor_registry = make_sensor_registry()
+
+    if not is_batch(event):
+        return process_batch(sensor_registry, [event])[0]
+
+    readings = unpack_batch(event)
+    logger.info(f"Processing batch of {len(readings)} readings")
+    return {"status_code": 200, "results": process_batch(sensor_registry, readings)}
+
 
-    sensor_id = str(event["sensor_id"])
-    location_id = str(event["location_id"])
-    r = float(event["value"])
+def make_sensor_registry() -> dynamodb.SensorRegistryClient:
+    """Registry client is created for each event, the cache is shared between warm invocations when enabled"""
+    if context.registry_cache_size > 0:
+        return dynamodb.CachedSensorRegistryClient(
+            context.dynamodb, table_name=context.sensor_registry_table, cache=registry_cache
+        )
 
-    if not sensor_registry.exists(sensor_id):
-        # assume the sensor is working ok, when it is first registered
-        sensor_registry.put_item(sensor_id, working_ok=True)
+    return dynamodb.SensorRegistryClient(context.dynamodb, table_name=context.sensor_registry_table)
 
-    if not sensor_registry.get_item(sensor_id).get("working_ok"):
+
+def check_registry(sensor_registry: dynamodb.SensorRegistryClient, sensor_ids: list[str]) -> dict[str, bool]:
+    """
+    Returns `working_ok` status of each sensor, known sensors are resolved in bulk for batches
+    Sensors seen first time are registered using conditional update, which never overwrites broken status
+    """
+    working_ok = sensor_registry.get_items(sensor_ids) if len(sensor_ids) > 1 else {}
+
+    for sensor_id in sensor_ids:
+        if sensor_id not in working_ok:
+            # assume the sensor is working ok, when it is first registered
+            working_ok[sensor_id] = sensor_registry.register(sensor_id)
+
+    return working_ok
+
+
+def convert_readings(readings: list[dict]) -> list[sensor.Reading]:
+    """
+    Range checks, temperatures and statuses are computed for all readings of batch in single vectorized pass
+    Single reading uses the scalar functions, so numpy, which adds tens of milliseconds, is not imported on cold start
+    """
+    if len(readings) == 1:
+        return [convert_reading(readings[0])]
+
+    import numpy as np
+    import vectorized
+
+    r = np.array([float(reading["value"]) for reading in readings])
+    in_range = vectorized.in_range_mask(r)
+    temperatures = vectorized.compute_temperatures(np.where(in_range, r, sensor.MIN_R))  # out of range is ignored later
+    status_codes = vectorized.get_status_codes(temperatures)
+
+    return [
+        sensor.Reading(
+            sensor_id=str(reading["sensor_id"]),
+            location_id=str(reading["location_id"]),
+            in_range=bool(ok),
+            temperature=float(temperature),
+            status=sensor.STATUS_CODES[code],
+        )
+        for reading, ok, temperature, code in zip(readings, in_range, temperatures, status_codes)
+    ]
+
+
+def convert_reading(reading: dict) -> sensor.Reading:
+    r = float(reading["value"])
+    in_range = sensor.is_in_range(r)
+    temperature = sensor.compute_temperature(r if in_range else sensor.MIN_R)  # out of range is ignored later
+
+    return sensor.Reading(
+        sensor_id=str(reading["sensor_id"]),
+        location_id=str(reading["location_id"]),
+        in_range=in_range,
+        temperature=temperature,
+        status=sensor.get_status(temperature),
+    )
+
+
+def process_batch(sensor_registry: dynamodb.SensorRegistryClient, raw_readings: list[dict]) -> list[dict]:
+    """
+    Process readings together, registry is checked once for each distinct sensor in the batch
+    Readings are processed in order, so sensor marked as broken by a reading causes all later readings to be ignored
+    """
+    readings = convert_readings(raw_readings)
+    sensor_ids = list(dict.fromkeys(reading.sensor_id for reading in readings))  # distinct, in order
+    working_ok = check_registry(sensor_registry, sensor_ids)
+
+    critical = collections.defaultdict(list)  # temperatures of critical readings for each sensor and location
+
+    with sqs.BufferedSender(context) as sender:  # messages are forwarded in batches, flushed at the end
+        results = [process_reading(sensor_registry, sender, working_ok, critical, reading) for reading in readings]
+
+    sns.notify_critical(context, sensor_registry, critical)
+    return results
+
+
+def process_reading(
+    sensor_registry: dynamodb.SensorRegistryClient,
+    sender: sqs.BufferedSender,
+    working_ok: dict[str, bool],
+    critical: dict[tuple[str, str], list[float]],
+    reading: sensor.Reading,
+) -> dict:
+    sensor_id, location_id = reading.sensor_id, reading.location_id
+    temperature, status = reading.temperature, reading.status
+
+    if not working_ok[sensor_id]:
         return {"status_code": 204}  # sensor is not working, ignore the event
 
-    if not sensor.is_in_range(r):  # the current reading is out of range
+    if not reading.in_range:  # the current reading is out of range
         sensor_registry.update_item(sensor_id, working_ok=False)  # mark the sensor as not working
+        working_ok[sensor_id] = False
         return {"status_code": 204}
 
-    temperature = sensor.compute_temperature(r)
-    status = sensor.get_status(temperature)
-
     logger.info(f"Sensor {sensor_id} has temperature {temperature} and status {status.value} at {location_id}")
     logger.info("Forwarding message to SQS")
-    sqs.send_message(context, sensor_id, location_id, temperature, status)
+    sender.send_message(sensor_id, location_id, temperature, status)
 
     if status == sensor.SensorStatus.TEMPERATURE_CRITICAL:
-        alert = f"Sensor {sensor_id} is in critical state with temperature {temperature} at {location_id}!"
-        sns.notify(context, message=alert)
+        critical[(sensor_id, location_id)].append(temperature)  # alerts are sent for the whole batch
 
     return {
         "status_code": 200,
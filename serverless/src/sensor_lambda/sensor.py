@@ -3,6 +3,7 @@ from typing import Final
 
 import dataclasses
 import enum
+import functools
 
 import boto3
 
@@ -12,6 +13,10 @@ B: Final[float] = 0.000234125
 C: Final[float] = 0.0000000876741
 MIN_R: Final[float] = float(1)
 MAX_R: Final[float] = float(20_000)
+# lower bounds of temperature for each status
+TEMPERATURE_OK: Final[float] = 20
+TEMPERATURE_TOO_HIGH: Final[float] = 100
+TEMPERATURE_CRITICAL: Final[float] = 250
 
 
 class SensorStatus(enum.Enum):
@@ -21,13 +26,22 @@ class SensorStatus(enum.Enum):
     TEMPERATURE_CRITICAL = "TEMPERATURE_CRITICAL"
 
 
+# status for each interval between temperature bounds, indexed by status codes returned from `get_status_codes`
+STATUS_CODES: Final[tuple[SensorStatus, ...]] = (
+    SensorStatus.TEMPERATURE_TOO_LOW,
+    SensorStatus.OK,
+    SensorStatus.TEMPERATURE_TOO_HIGH,
+    SensorStatus.TEMPERATURE_CRITICAL,
+)
+
+
 def compute_temperature(r: float) -> float:
     """
     Compute the temperature in Kelvin using the Steinhart-Hart equation.
     For reference, see: https://en.wikipedia.org/wiki/Steinhart%E2%80%93Hart_equation
     """
     log_r = math.log(r)
-    kelvins = 1 / (A + B * math.log(r) + C * math.pow(log_r, 3))
+    kelvins = 1 / (A + B * log_r + C * math.pow(log_r, 3))
     return kelvins - 273.15
 
 
@@ -36,16 +50,25 @@ def is_in_range(r: float) -> bool:
 
 
 def get_status(temperature: float) -> SensorStatus:
-    if temperature < 20:
+    if temperature < TEMPERATURE_OK:
         return SensorStatus.TEMPERATURE_TOO_LOW
-    elif temperature < 100:
+    elif temperature < TEMPERATURE_TOO_HIGH:
         return SensorStatus.OK
-    elif temperature < 250:
+    elif temperature < TEMPERATURE_CRITICAL:
         return SensorStatus.TEMPERATURE_TOO_HIGH
 
     return SensorStatus.TEMPERATURE_CRITICAL
 
 
+@dataclasses.dataclass
+class Reading:
+    sensor_id: str
+    location_id: str
+    in_range: bool
+    temperature: float
+    status: SensorStatus
+
+
 @dataclasses.dataclass
 class Context:
     env: str
@@ -54,22 +77,40 @@ class Context:
     sns_topic_arn: str
     sqs_url: str
     idempotency_table: str
-    dynamodb: "boto3.client.dynamodb"
-    sns: "boto3.client.sns"
-    sqs: "boto3.client.sqs"
+    registry_cache_size: int
+    registry_cache_ttl_seconds: float
+    alert_window_seconds: float
+    idempotency_key_fields: list[str]
+    idempotency_local_cache_size: int
+
+    # clients are created on first use and cached, so they are shared between warm invocations
+    @functools.cached_property
+    def dynamodb(self) -> "boto3.client.dynamodb":
+        return boto3.client("dynamodb", region_name=self.aws_region)
+
+    @functools.cached_property
+    def sns(self) -> "boto3.client.sns":
+        return boto3.client("sns", region_name=self.aws_region)
+
+    @functools.cached_property
+    def sqs(self) -> "boto3.client.sqs":
+        return boto3.client("sqs", region_name=self.aws_region)
 
     @classmethod
     def from_dict(cls, env: dict):
-        aws_region = env["AWS_REGION"]
-
         return cls(
             env=env["ENV"],
-            aws_region=aws_region,
+            aws_region=env["AWS_REGION"],
             sensor_registry_table=env["SENSOR_REGISTRY_TABLE"],
             sns_topic_arn=env["SNS_TOPIC_ARN"],
             sqs_url=env["SQS_URL"],
             idempotency_table=env["LAMBDA_IDEMPOTENCY_TABLE"],
-            dynamodb=boto3.client("dynamodb", region_name=aws_region),
-            sns=boto3.client("sns", region_name=aws_region),
-            sqs=boto3.client("sqs", region_name=aws_region),
+            # registry cache is disabled by default
+            registry_cache_size=int(env.get("SENSOR_REGISTRY_CACHE_SIZE", 0)),
+            registry_cache_ttl_seconds=float(env.get("SENSOR_REGISTRY_CACHE_TTL_SECONDS", 60)),
+            # alerts are only aggregated within single invocation by default
+            alert_window_seconds=float(env.get("SNS_ALERT_WINDOW_SECONDS", 0)),
+            # comma separated fields of the reading, e.g. `sensor_id,location_id,timestamp`, whole event by default
+            idempotency_key_fields=[field for field in env.get("IDEMPOTENCY_KEY_FIELDS", "").split(",") if field],
+            idempotency_local_cache_size=int(env.get("IDEMPOTENCY_LOCAL_CACHE_SIZE", 256)),
         )
@@ -1,5 +1,6 @@
 import os
 
+from dynamodb import SensorRegistryClient
 from sensor import Context
 
 
@@ -9,3 +10,39 @@ def notify(context: Context, message: str):
         Message=message,
         Subject="AWS Lab Error Alert",
     )
+
+
+def summarize(sensor_id: str, location_id: str, temperatures: list[float], suppressed: int = 0) -> str:
+    if len(temperatures) == 1:
+        message = f"Sensor {sensor_id} is in critical state with temperature {temperatures[0]} at {location_id}!"
+    else:
+        message = (
+            f"Sensor {sensor_id} is in critical state at {location_id}! "
+            f"Received {len(temperatures)} critical readings with maximum temperature {max(temperatures)}"
+        )
+
+    if suppressed:
+        message += f" {suppressed} critical readings were suppressed since the previous alert."
+    return message
+
+
+def notify_critical(
+    context: Context,
+    sensor_registry: SensorRegistryClient,
+    critical: dict[tuple[str, str], list[float]],
+):
+    """
+    Send single summary alert for each group of critical readings from the same sensor and location
+    When `alert_window_seconds` is set, alerts for the sensor and location are suppressed for the window across all
+    Lambdas, suppressed readings are counted and reported in the alert opening the next window
+    """
+    for (sensor_id, location_id), temperatures in critical.items():
+        suppressed = 0
+        if context.alert_window_seconds > 0:
+            suppressed = sensor_registry.open_alert_window(
+                sensor_id, location_id, context.alert_window_seconds, readings=len(temperatures)
+            )
+            if suppressed is None:
+                continue  # alert was already sent within the window
+
+        notify(context, message=summarize(sensor_id, location_id, temperatures, suppressed))
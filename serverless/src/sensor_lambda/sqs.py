@@ -1,16 +1,16 @@
 import json
 from datetime import datetime as dt
+from typing import Final
 
+import retry
 from sensor import Context, SensorStatus
 
+# limits of SQS SendMessageBatch
+MAX_BATCH_ENTRIES: Final[int] = 10
+MAX_BATCH_BYTES: Final[int] = 262_144
 
-def send_message(
-    context: Context,
-    sensor_id: str,
-    location_id: str,
-    temperature: float,
-    status: SensorStatus,
-):
+
+def make_message(sensor_id: str, location_id: str, temperature: float, status: SensorStatus) -> str:
     message = {
         "sensor_id": sensor_id,
         "location_id": location_id,
@@ -19,4 +19,63 @@ def send_message(
         "timestamp": dt.now().isoformat(),
     }
 
-    context.sqs.send_message(QueueUrl=context.sqs_url, MessageBody=json.dumps(message))
+    return json.dumps(message)
+
+
+def send_message(
+    context: Context,
+    sensor_id: str,
+    location_id: str,
+    temperature: float,
+    status: SensorStatus,
+):
+    message = make_message(sensor_id, location_id, temperature, status)
+    context.sqs.send_message(QueueUrl=context.sqs_url, MessageBody=message)
+
+
+class BufferedSender:
+    """
+    Sender buffering messages and forwarding them using SendMessageBatch of up to 10 entries or 256 KB
+    Use as context manager to flush remaining messages at the end of the invocation
+    """
+
+    def __init__(self, context: Context):
+        self.context = context
+        self.entries: list[dict] = []
+        self.size = 0
+        self.count = 0  # used to generate entry IDs unique within the batch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.flush()
+
+    def send_message(self, sensor_id: str, location_id: str, temperature: float, status: SensorStatus):
+        message = make_message(sensor_id, location_id, temperature, status)
+        size = len(message.encode("utf-8"))
+
+        if len(self.entries) == MAX_BATCH_ENTRIES or self.size + size > MAX_BATCH_BYTES:
+            self.flush()
+
+        self.entries.append({"Id": str(self.count), "MessageBody": message})
+        self.size += size
+        self.count += 1
+
+    def flush(self):
+        """Send buffered messages, retrying only failed entries, which are not caused by the sender"""
+        entries, self.entries, self.size = self.entries, [], 0
+
+        if entries := retry.with_backoff(self.send_batch, entries):
+            raise RuntimeError(f"Failed to send {len(entries)} messages to SQS after {retry.MAX_ATTEMPTS} attempts!")
+
+    def send_batch(self, entries: list[dict]) -> list[dict]:
+        """Returns the entries, which failed and can be retried"""
+        response = self.context.sqs.send_message_batch(QueueUrl=self.context.sqs_url, Entries=entries)
+        failed = response.get("Failed", [])
+
+        if sender_faults := [failure for failure in failed if failure["SenderFault"]]:
+            raise RuntimeError(f"SQS rejected messages: {sender_faults}")
+
+        failed_ids = {failure["Id"] for failure in failed}
+        return [entry for entry in entries if entry["Id"] in failed_ids]
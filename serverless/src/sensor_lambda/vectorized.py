@@ -0,0 +1,22 @@
+import numpy as np
+
+from sensor import MAX_R, MIN_R, TEMPERATURE_CRITICAL, TEMPERATURE_OK, TEMPERATURE_TOO_HIGH, A, B, C
+
+
+def compute_temperatures(r: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of `sensor.compute_temperature` for array of resistances
+    Resistances out of range should be masked using `in_range_mask`, the logarithm is not defined for r <= 0
+    """
+    log_r = np.log(r)
+    kelvins = 1 / (A + B * log_r + C * log_r**3)
+    return kelvins - 273.15
+
+
+def in_range_mask(r: np.ndarray) -> np.ndarray:
+    return (MIN_R <= r) & (r <= MAX_R)
+
+
+def get_status_codes(temperatures: np.ndarray) -> np.ndarray:
+    """Vectorized version of `sensor.get_status`, returns index into `sensor.STATUS_CODES` for each temperature"""
+    return np.digitize(temperatures, (TEMPERATURE_OK, TEMPERATURE_TOO_HIGH, TEMPERATURE_CRITICAL))
@@ -58,14 +58,42 @@ def mocked_dynamodb(mocked_aws):
     # Create the idempotency table
     dynamodb.create_table(
         TableName=settings.IDEMPOTENCY_TABLE,
-        KeySchema=[{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
-        AttributeDefinitions=[{"AttributeName": "idempotency_key", "AttributeType": "S"}],
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+        ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
+    )
+
+    # Create the table with partial aggregates of the reporter
+    dynamodb.create_table(
+        TableName=settings.AGGREGATE_STATE_TABLE,
+        KeySchema=[
+            {"AttributeName": "location_id", "KeyType": "HASH"},
+            {"AttributeName": "hour", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "location_id", "AttributeType": "S"},
+            {"AttributeName": "hour", "AttributeType": "S"},
+        ],
         ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
     )
 
     yield dynamodb
 
 
+@pytest.fixture(scope="function")
+def mock_env(mocked_sqs):
+    _, queue_url = mocked_sqs
+    return {
+        "ENV": "test",
+        "SQS_URL": queue_url,
+        "INPUT_BUCKET": settings.INPUT_BUCKET_NAME,
+        "PAYLOAD_BUCKET": settings.PAYLOAD_BUCKET_NAME,
+        "AWS_REGION": settings.TEST_AWS_REGION,
+        "AWS_PROFILE_NAME": settings.TEST_AWS_PROFILE_NAME,
+        "SQS_WAIT_TIME_SECONDS": "1",
+    }
+
+
 @pytest.fixture
 def lambda_context():
     context_data = {
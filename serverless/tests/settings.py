@@ -12,3 +12,4 @@ TOPIC_NAME = "test-sns-topic"
 # DynamoDB
 SENSOR_REGISTRY_TABLE = "sensor-registry"
 IDEMPOTENCY_TABLE = "test-idempotency"
+AGGREGATE_STATE_TABLE = "test-sensor-aggregates"
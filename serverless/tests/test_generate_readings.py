@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.generate_readings import COLUMNS, GeneratorConfig, generate, write_csv, write_parquet
+
+
+def test_generate_is_reproducible():
+    config = GeneratorConfig(locations=20)
+    first = pd.concat(generate(10_000, config, chunk_size=1_000, seed=1))
+    second = pd.concat(generate(10_000, config, chunk_size=1_000, seed=1))
+    other = pd.concat(generate(10_000, config, chunk_size=1_000, seed=2))
+
+    pd.testing.assert_frame_equal(first, second)
+    assert not first["temperature"].equals(other["temperature"])
+
+
+def test_generate_readings_properties():
+    config = GeneratorConfig(locations=50, skew=1.5, failure_rate=0.2, spike_rate=0.01, late_rate=0.05)
+    data = pd.concat(generate(100_000, config, chunk_size=10_000), ignore_index=True)
+
+    assert list(data.columns) == COLUMNS
+    assert data["location_id"].between(1, config.locations).all()
+    assert data["timestamp"].between(pd.Timestamp(config.start), pd.Timestamp(config.start) + pd.Timedelta("1h")).all()
+    # readings of failed sensors are dropped
+    assert len(data) < 100_000
+    # rates of locations are skewed
+    assert data["location_id"].value_counts().max() > 10 * len(data) / config.locations
+    # spikes have critical status
+    critical = data["status"] == "TEMPERATURE_CRITICAL"
+    assert critical.mean() == pytest.approx(config.spike_rate, rel=0.2)
+    assert (data.loc[critical, "temperature"] >= 250).all()
+    # late readings have timestamps earlier than readings before them
+    assert (data["timestamp"].diff().dt.total_seconds() < 0).mean() == pytest.approx(config.late_rate, rel=0.2)
+
+
+@pytest.mark.parametrize("writer", (write_csv, write_parquet))
+def test_write_readings(writer, tmp_path):
+    path = tmp_path / "readings"
+    expected = pd.concat(generate(5_000, chunk_size=1_000), ignore_index=True)
+
+    assert writer(generate(5_000, chunk_size=1_000), path) == len(expected)
+
+    data = pd.read_csv(path) if writer is write_csv else pd.read_parquet(path)
+    np.testing.assert_array_equal(pd.to_datetime(data["timestamp"]), expected["timestamp"])
+    pd.testing.assert_frame_equal(data.drop(columns="timestamp"), expected.drop(columns="timestamp"))
@@ -0,0 +1,141 @@
+import os
+
+import awswrangler as wr
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.local_workflow import LocalWorkflow, StatesError, load_definition
+from tests import settings
+
+
+def make_handlers() -> dict:
+    from src.receiver_lambda.main import handler as receiver_handler
+    from src.reporter_lambda.main import handler as reporter_handler
+
+    return {"receiver_lambda": receiver_handler, "reporter_lambda": reporter_handler}
+
+
+@pytest.mark.parametrize(["num_rows", "num_locations"], ((100, 5), (20_000, 20)))
+def test_local_workflow_matches_reporter(num_rows: int, num_locations: int, mock_env, mocked_s3, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handlers
+    from src.reporter_lambda.aggregate import aggregate_minutes
+
+    rng = np.random.default_rng(num_rows)
+    data = pd.DataFrame(
+        {
+            "location_id": rng.integers(1, num_locations + 1, num_rows),
+            "temperature": rng.uniform(20, 250, num_rows),
+            "timestamp": (pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 3600, num_rows), unit="s")),
+        }
+    )
+    wr.s3.to_csv(data.astype({"timestamp": str}), f"s3://{settings.INPUT_BUCKET_NAME}/test.csv", index=False)
+
+    workflow = LocalWorkflow(load_definition(), make_handlers(), max_concurrency=4)
+    output = workflow.run({"source": "S3", "key": "test.csv"})
+
+    # workflow output is the list of reports of each location
+    expected = [aggregate_minutes(group) for _, group in data.groupby("location_id")]
+    assert len(output) == len(expected)
+    for report, expected_report in zip(output, expected):
+        assert report == pytest.approx(expected_report, abs=0.01)
+
+    assert workflow.timings.executions == {"prepare-data": 1, "batch-compute": num_locations, "ProcessBatches": 1}
+
+
+def make_definition(max_attempts: int) -> dict:
+    retry = [{"ErrorEquals": ["ValueError"], "IntervalSeconds": 0, "MaxAttempts": max_attempts}]
+    return {
+        "StartAt": "split",
+        "States": {
+            "split": {
+                "Type": "Task",
+                "Resource": "arn:aws:states:::lambda:invoke",
+                "Parameters": {"FunctionName": "split", "Payload.$": "$"},
+                "OutputPath": "$.Payload",
+                "Retry": retry,
+                "Next": "map",
+            },
+            "map": {
+                "Type": "Map",
+                "ItemsPath": "$.items",
+                "Parameters": {"value.$": "$$.Map.Item.Value", "index.$": "$$.Map.Item.Index"},
+                "Iterator": {
+                    "StartAt": "square",
+                    "States": {
+                        "square": {
+                            "Type": "Task",
+                            "Resource": "arn:aws:states:::lambda:invoke",
+                            "Parameters": {"FunctionName": "square", "Payload": {"value.$": "$.value"}},
+                            "OutputPath": "$.Payload",
+                            "End": True,
+                        }
+                    },
+                },
+                "End": True,
+            },
+        },
+    }
+
+
+@pytest.mark.parametrize(["failures", "max_attempts", "succeeds"], ((0, 0, True), (2, 2, True), (3, 2, False)))
+def test_local_workflow_retries_task(failures: int, max_attempts: int, succeeds: bool):
+    calls = []
+
+    def split(event: dict, _) -> dict:
+        calls.append(event)
+        if len(calls) <= failures:
+            raise ValueError("Transient failure")
+        return {"items": list(range(event["size"]))}
+
+    workflow = LocalWorkflow(
+        make_definition(max_attempts), {"split": split, "square": lambda event, _: event["value"] ** 2}
+    )
+
+    if succeeds:
+        assert workflow.run({"size": 5}) == [0, 1, 4, 9, 16]
+        assert workflow.timings.executions["square"] == 5
+    else:
+        with pytest.raises(StatesError, match="ValueError"):
+            workflow.run({"size": 5})
+
+    assert len(calls) == min(failures, max_attempts) + 1
+
+
+@pytest.mark.parametrize(["num_rows", "target_rows"], ((500, 100), (20_000, 3000)))
+def test_local_workflow_with_packed_batches(num_rows: int, target_rows: int, mock_env, mocked_s3, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handlers
+    from src.receiver_lambda import main as receiver
+    from src.reporter_lambda.aggregate import aggregate_minutes
+
+    mocker.patch.object(receiver.context, "batch_target_rows", target_rows)
+
+    # skewed locations, the first location has most of the readings
+    rng = np.random.default_rng(num_rows)
+    data = pd.DataFrame(
+        {
+            "location_id": np.minimum(rng.geometric(0.2, num_rows), 50),
+            "temperature": rng.uniform(20, 250, num_rows),
+            "timestamp": (pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 3600, num_rows), unit="s")),
+        }
+    )
+    wr.s3.to_csv(data.astype({"timestamp": str}), f"s3://{settings.INPUT_BUCKET_NAME}/test.csv", index=False)
+
+    workflow = LocalWorkflow(load_definition(), make_handlers(), max_concurrency=4)
+    output = workflow.run({"source": "S3", "key": "test.csv"})
+    assert len(output) == -(-num_rows // target_rows)  # ceil
+
+    # reports of the location split into multiple batches are merged
+    merged = {}
+    for report in output:
+        for location_id, minutes in report.items():
+            assert not set(merged.get(location_id, {})) & set(minutes)  # each minute is computed in single batch
+            merged.setdefault(location_id, {}).update(minutes)
+
+    expected = {
+        str(location_id): aggregate_minutes(group, fill_gaps=False)
+        for location_id, group in data.groupby("location_id")
+    }
+    assert merged.keys() == expected.keys()
+    for location_id, minutes in expected.items():
+        assert merged[location_id] == pytest.approx(minutes, abs=0.01)
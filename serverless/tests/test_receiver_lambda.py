@@ -1,7 +1,8 @@
 import json
 import os
 import random
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 
 import awswrangler as wr
 import boto3
@@ -13,10 +14,10 @@ from tests import settings
 
 def random_date():
     """Generate a random datetime between 2020-01-01 and now."""
-    delta = datetime.now() - datetime.min
+    delta = datetime.now() - datetime(2020, 1, 1)
     delta_seconds = delta.total_seconds()
     random_seconds = random.uniform(0, delta_seconds)
-    return datetime.min + timedelta(seconds=random_seconds)
+    return datetime(2020, 1, 1) + timedelta(seconds=random_seconds)
 
 
 def prepare_s3_input(num_locations: int, num_csv_rows: int):
@@ -50,19 +51,6 @@ def prepare_sqs_input(num_locations: int, num_csv_rows: int):
         sqs.send_message(QueueUrl=queue_url, MessageBody=message)
 
 
-@pytest.fixture
-def mock_env(mocked_sqs):
-    _, queue_url = mocked_sqs
-    return {
-        "ENV": "test",
-        "SQS_URL": queue_url,
-        "INPUT_BUCKET": settings.INPUT_BUCKET_NAME,
-        "PAYLOAD_BUCKET": settings.PAYLOAD_BUCKET_NAME,
-        "AWS_REGION": settings.TEST_AWS_REGION,
-        "AWS_PROFILE_NAME": settings.TEST_AWS_PROFILE_NAME,
-    }
-
-
 @pytest.mark.parametrize(
     ["num_rows", "num_locations"],
     (
@@ -107,3 +95,273 @@ def test_receiver_lambda_handler_sqs(num_rows: int, num_locations: int, mock_env
 
     assert response["status_code"] == 200
     assert len(response["batches"]) <= num_locations  # some locations may not have data
+
+
+@pytest.mark.parametrize(["num_rows", "max_messages"], ((25, 100), (100, 100), (100, 35)))
+def test_drain_sqs(num_rows: int, max_messages: int, mock_env, mocked_sqs, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+    prepare_sqs_input(num_locations=5, num_csv_rows=num_rows)
+    sqs, queue_url = mocked_sqs
+
+    from src.receiver_lambda import drain
+
+    # single receiver, since concurrent receivers can get the same message twice from moto, which is not thread-safe
+    messages = drain.drain(
+        sqs, queue_url, max_messages, max_seconds=10, workers=1, wait_time_seconds=1, visibility_timeout=30
+    )
+    assert len(messages) == min(num_rows, max_messages)
+    assert len({message["MessageId"] for message in messages}) == len(messages)  # no message is received twice
+
+    assert drain.delete(sqs, queue_url, messages, workers=4) == 0
+    attributes = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["All"])["Attributes"]
+    assert int(attributes["ApproximateNumberOfMessages"]) == num_rows - len(messages)  # not drained are left
+    assert int(attributes["ApproximateNumberOfMessagesNotVisible"]) == 0  # drained messages are deleted
+
+
+def test_drain_sqs_duplicates_delete_all_receipt_handles(mocker):
+    from src.receiver_lambda import drain
+
+    mocker.patch.object(drain.time, "sleep")
+    first = {"MessageId": "1", "ReceiptHandle": "handle-1", "Body": "{}"}
+    duplicate = {"MessageId": "1", "ReceiptHandle": "handle-2", "Body": "{}"}  # the same message received again
+    other = {"MessageId": "2", "ReceiptHandle": "handle-3", "Body": "{}"}
+    sqs = mocker.Mock()
+    sqs.receive_message.side_effect = [{"Messages": [first, other]}, {"Messages": [duplicate]}, {}]
+    sqs.delete_message_batch.side_effect = [
+        {"Failed": [{"Id": "1", "SenderFault": False}]},  # failed entry is retried
+        {"Failed": []},
+    ]
+
+    messages = drain.drain(sqs, "url", 10, max_seconds=10, workers=1, wait_time_seconds=1, visibility_timeout=30)
+    assert drain.unique(messages) == [first, other]  # payload contains each message once
+    assert drain.delete(sqs, "url", messages, workers=1) == 0
+
+    deleted = [call.kwargs["Entries"] for call in sqs.delete_message_batch.call_args_list]
+    assert [entry["ReceiptHandle"] for entry in deleted[0]] == ["handle-1", "handle-3", "handle-2"]
+    assert [entry["ReceiptHandle"] for entry in deleted[1]] == ["handle-3"]
+
+
+@pytest.mark.parametrize(["num_rows", "num_locations"], ((10, 2), (1000, 10), (2500, 50), (5000, 10), (100_000, 100)))
+def test_receiver_payload_size_limit(num_rows: int, num_locations: int, mock_env, mocked_s3, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+
+    from src.receiver_lambda.main import BUFFER, MAX_PAYLOAD_SIZE, make_payload
+
+    data = pd.DataFrame(
+        {
+            "location_id": [random.randint(1, num_locations) for _ in range(num_rows)],
+            "temperature": [random.uniform(20, 250) for _ in range(num_rows)],
+            "timestamp": [random_date().isoformat() for _ in range(num_rows)],
+        }
+    )
+    batches = [
+        group[["location_id", "temperature", "timestamp"]].to_dict("records")
+        for _, group in data.groupby("location_id")
+    ]
+    fits = len(json.dumps({"status_code": 200, "source": "EVENT", "batches": batches})) <= MAX_PAYLOAD_SIZE - BUFFER
+
+    payload = make_payload(data)
+
+    assert payload["source"] == ("EVENT" if fits else "S3_PARQUET")
+    assert len(payload["batches"]) == len(batches)
+    if fits:
+        assert payload["batches"] == batches
+
+
+@pytest.mark.parametrize("tzinfo", (None, timezone.utc))
+def test_receiver_parquet_spill_is_typed(mock_env, mocked_s3, mocker, tzinfo: timezone | None):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+
+    from src.receiver_lambda.main import make_payload
+
+    data = pd.DataFrame(
+        {
+            "location_id": [random.randint(1, 10) for _ in range(10_000)],
+            "temperature": [random.uniform(20, 250) for _ in range(10_000)],
+            "timestamp": [random_date().replace(tzinfo=tzinfo).isoformat() for _ in range(10_000)],
+        }
+    )
+
+    payload = make_payload(data)
+    batch = wr.s3.read_parquet(payload["batches"][0])
+
+    assert payload["source"] == "S3_PARQUET"
+    assert pd.api.types.is_datetime64_any_dtype(batch["timestamp"])
+    assert isinstance(batch["location_id"].dtype, pd.CategoricalDtype)  # dictionary encoded
+
+
+def test_receiver_spill_is_scoped_to_execution(mock_env, mocked_s3, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+
+    from src.receiver_lambda import main
+
+    mocker.patch.object(main.context, "spill_manifest", True)
+    data = pd.DataFrame(
+        {
+            "location_id": [random.randint(1, 20) for _ in range(10_000)],
+            "temperature": [random.uniform(20, 250) for _ in range(10_000)],
+            "timestamp": [random_date().isoformat() for _ in range(10_000)],
+        }
+    )
+
+    first = main.make_payload(data, execution_id="first")
+    second = main.make_payload(data, execution_id="second")
+
+    assert not set(first["batches"]) & set(second["batches"])  # concurrent executions do not overwrite each other
+    assert all(path.startswith(f"s3://{settings.PAYLOAD_BUCKET_NAME}/first/location_id=") for path in first["batches"])
+
+    manifest = json.loads(
+        mocked_s3.get_object(Bucket=settings.PAYLOAD_BUCKET_NAME, Key="first/manifest.json")["Body"].read()
+    )
+    assert [batch["path"] for batch in manifest["batches"]] == first["batches"]
+    assert sum(batch["rows"] for batch in manifest["batches"]) == len(data)
+
+
+@pytest.mark.parametrize(["num_rows", "num_locations", "sort"], ((100, 5, False), (1000, 10, False), (1000, 10, True)))
+def test_receiver_lambda_handler_s3_streaming(
+    num_rows: int, num_locations: int, sort: bool, mock_env, mocked_s3, lambda_context, mocker
+):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+    data = prepare_s3_input(num_locations, num_rows)
+    if sort:  # sorted input allows uploading each location as soon as it is finished
+        data = data.sort_values("location_id")
+        wr.s3.to_csv(df=data, path=f"s3://{settings.INPUT_BUCKET_NAME}/test.csv", index=False)
+
+    from src.receiver_lambda import main
+
+    mocker.patch.object(main.context, "read_chunk_size", 50)
+    mocker.patch.object(main.context, "stream_buffer_rows", 200)
+
+    response = main.handler({"source": "S3", "key": "test.csv"}, lambda_context)
+
+    assert response["status_code"] == 200
+    assert response["source"] == "S3_PARQUET"
+    assert len(response["batches"]) == data["location_id"].nunique()
+    for prefix, (location_id, group) in zip(response["batches"], data.groupby("location_id")):
+        batch = wr.s3.read_parquet(prefix)  # all parts of single location are read together
+        assert set(batch["location_id"]) == {str(location_id)}
+        assert sorted(batch["temperature"]) == pytest.approx(sorted(group["temperature"]))
+
+
+def test_receiver_lambda_handler_s3_streaming_many_flushes(mock_env, mocked_s3, lambda_context, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+    from scripts.generate_readings import GeneratorConfig, generate
+
+    # time ordered input has all locations in each chunk, so each flush writes new part of every location
+    data = pd.concat(generate(5000, GeneratorConfig(locations=20, skew=0), chunk_size=1000), ignore_index=True)
+    wr.s3.to_csv(df=data, path=f"s3://{settings.INPUT_BUCKET_NAME}/test.csv", index=False)
+
+    from src.receiver_lambda import main
+
+    mocker.patch.object(main.context, "read_chunk_size", 100)
+    mocker.patch.object(main.context, "stream_buffer_rows", 200)
+    mocker.patch.object(main.context, "spill_manifest", True)
+
+    response = main.handler({"source": "S3", "key": "test.csv"}, lambda_context)
+
+    key = f"{lambda_context.aws_request_id}/manifest.json"
+    manifest = json.loads(mocked_s3.get_object(Bucket=settings.PAYLOAD_BUCKET_NAME, Key=key)["Body"].read())
+    assert len(manifest["batches"]) > 10 * data["location_id"].nunique()  # many parts of each location
+    assert len(response["batches"]) == data["location_id"].nunique()  # but single prefix of each location
+    assert len(json.dumps(response)) < 100 * len(response["batches"])
+
+    batches = [wr.s3.read_parquet(prefix) for prefix in response["batches"]]
+    assert sum(len(batch) for batch in batches) == len(data)
+
+
+def test_receiver_lambda_handler_s3_streaming_packed(mock_env, mocked_s3, lambda_context, mocker):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+    from scripts.generate_readings import GeneratorConfig, generate
+
+    data = pd.concat(generate(3000, GeneratorConfig(locations=1000, skew=0), chunk_size=1000), ignore_index=True)
+    wr.s3.to_csv(df=data, path=f"s3://{settings.INPUT_BUCKET_NAME}/test.csv", index=False)
+
+    from src.receiver_lambda import main
+    from src.reporter_lambda.main import handler as reporter_handler
+
+    mocker.patch.object(main.context, "read_chunk_size", 100)
+    mocker.patch.object(main.context, "stream_buffer_rows", 500)
+    mocker.patch.object(main.context, "batch_target_rows", 500)
+
+    response = main.handler({"source": "S3", "key": "test.csv"}, lambda_context)
+
+    # payload grows with the number of batches, not with the number of locations or parts
+    assert response["packed"]
+    assert len(response["batches"]) == -(-len(data) // 500)  # ceil
+    assert len(json.dumps(response)) < 200 * len(response["batches"])
+
+    reports = {}
+    for batch in response["batches"]:
+        report = reporter_handler({"batch": batch, "source": response["source"], "packed": True}, lambda_context)
+        assert not reports.keys() & report.keys()  # locations are never split between batches
+        reports |= report
+
+    assert reports.keys() == set(data["location_id"].astype(str))
+
+
+def test_location_spiller_bounds_pending_uploads(mocker):
+    from src.receiver_lambda import spill
+
+    s3_client = mocker.Mock()
+    s3_client.put_object.side_effect = lambda **_: time.sleep(0.01)  # uploads are slower than reading
+    spiller = spill.LocationSpiller(s3_client, "bucket", "prefix", spill.SpillFormat.csv, workers=2, buffer_rows=10)
+
+    for index in range(50):
+        spiller.add(pd.DataFrame({"location_id": [index % 5] * 5, "temperature": 20.0, "timestamp": "2025-01-01"}))
+        assert len(spiller.pending) <= 2
+
+    assert sum(len(parts) for parts in spiller.close()) == s3_client.put_object.call_count
+
+
+@pytest.mark.parametrize(["target_rows", "split_window"], ((1000, "1min"), (500, "1min"), (2000, "5min")))
+def test_plan_batches_is_balanced(target_rows: int, split_window: str):
+    from src.receiver_lambda.planner import plan_batches
+
+    # single busy location and many small locations
+    locations = [0] * 10_000 + [location_id for location_id in range(1, 501) for _ in range(10)]
+    data = pd.DataFrame(
+        {
+            "location_id": locations,
+            "temperature": [random.uniform(20, 250) for _ in locations],
+            "timestamp": [
+                (datetime(2025, 1, 1) + timedelta(seconds=random.randint(0, 7200))).isoformat() for _ in locations
+            ],
+        }
+    )
+
+    batches = plan_batches(data, target_rows, split_window)
+    sizes = [len(batch) for batch in batches]
+
+    assert sum(sizes) == len(data)
+    assert len(batches) == -(-len(data) // target_rows)  # ceil
+    assert max(sizes) <= 1.5 * target_rows
+
+    # each window of the split location is in single batch
+    windows = [
+        set(pd.to_datetime(batch.loc[batch["location_id"] == 0, "timestamp"]).dt.floor(split_window))
+        for batch in batches
+    ]
+    assert sum(len(window) for window in windows) == len(set().union(*windows))
+
+
+@pytest.mark.parametrize(
+    ["split_window", "report_windows", "expected"],
+    (("1min", "", "1min"), ("1min", "1min,5min,1h", "1h"), ("2h", "5min,1h", "2h"), ("1min", "5min,7min", None)),
+)
+def test_batch_split_window_covers_report_windows(split_window: str, report_windows: str, expected: str | None):
+    from src.receiver_lambda.receiver import Context
+
+    env = {
+        "SQS_URL": "queue",
+        "INPUT_BUCKET": "input",
+        "PAYLOAD_BUCKET": "payload",
+        "AWS_REGION": "us-east-1",
+        "BATCH_SPLIT_WINDOW": split_window,
+        "REPORT_WINDOWS": report_windows,
+    }
+    if expected is None:
+        with pytest.raises(ValueError, match="not multiple of window"):
+            Context.from_dict(env)
+        return
+
+    assert Context.from_dict(env).batch_split_window == expected
@@ -1,7 +1,13 @@
+from datetime import datetime, timezone
+
 import awswrangler as wr
+import freezegun
+import numpy as np
 import pandas as pd
 import pytest
 
+from tests import settings
+
 
 @pytest.mark.parametrize(
     ["event", "expected"],
@@ -98,3 +104,229 @@ def test_reporter_lambda_handler_from_s3(event: dict, key: str, expected: dict,
 
     response = handler(event, lambda_context)
     assert response == expected
+
+
+@pytest.mark.parametrize(
+    ["batch", "expected"],
+    (
+        (
+            [
+                {"temperature": 100, "timestamp": "2025-01-01 00:12:00"},
+                {"temperature": 50, "timestamp": "2025-01-01 00:12:30"},
+                {"temperature": 150, "timestamp": "2025-01-01 00:12:59.999999"},
+            ],
+            {"2025-01-01T00:12:00": 100},
+        ),
+        (
+            [
+                {"temperature": 100, "timestamp": "2025-01-01 00:12:00"},
+                {"temperature": 50, "timestamp": "2025-01-01 00:13:00"},
+            ],
+            {"2025-01-01T00:12:00": 100, "2025-01-01T00:13:00": 50},
+        ),
+    ),
+)
+def test_reporter_lambda_handler_from_parquet(batch: list[dict], expected: dict, lambda_context, mocked_s3):
+    from src.reporter_lambda.main import handler
+
+    key = "s3://test-sfn-payload-bucket/test.parquet"
+    data = pd.DataFrame(batch).assign(
+        location_id="1", timestamp=lambda df: pd.to_datetime(df["timestamp"], format="ISO8601")
+    )
+    wr.s3.to_parquet(data, key, index=False)
+
+    response = handler({"batch": key, "source": "S3_PARQUET"}, lambda_context)
+    assert response == expected
+
+
+def test_reporter_lambda_handler_from_parquet_parts(lambda_context, mocked_s3):
+    from src.reporter_lambda.main import handler
+
+    parts = [
+        [
+            {"temperature": 100, "timestamp": "2025-01-01 00:12:00"},
+            {"temperature": 20, "timestamp": "2025-01-01 00:13:00"},
+        ],
+        [{"temperature": 50, "timestamp": "2025-01-01 00:12:30"}],
+    ]
+    keys = [f"s3://test-sfn-payload-bucket/part-{index}.parquet" for index in range(len(parts))]
+    for key, part in zip(keys, parts):
+        wr.s3.to_parquet(
+            pd.DataFrame(part).assign(location_id="1", timestamp=lambda df: pd.to_datetime(df["timestamp"])), key
+        )
+
+    # all parts of single location are aggregated together
+    response = handler({"batch": keys, "source": "S3_PARQUET"}, lambda_context)
+    assert response == {"2025-01-01T00:12:00": 75, "2025-01-01T00:13:00": 20}
+
+
+@pytest.mark.parametrize("size", (1, 100, 10_000))
+def test_aggregate_minutes_matches_groupby(size: int):
+    from src.reporter_lambda.aggregate import aggregate_minutes
+
+    rng = np.random.default_rng(size)
+    data = pd.DataFrame(
+        {
+            "temperature": rng.uniform(-50, 150, size),
+            "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 6 * 3600, size), unit="s"),
+        }
+    )
+
+    # reference aggregation with explicit gaps filled with 0
+    expected = data.groupby(data["timestamp"].dt.floor("min"))["temperature"].mean()
+    expected = expected.reindex(pd.date_range(expected.index.min(), expected.index.max(), freq="min"), fill_value=0)
+
+    response = aggregate_minutes(data)
+    assert list(response) == [timestamp.isoformat() for timestamp in expected.index]
+    assert list(response.values()) == pytest.approx(expected.round(2).tolist(), abs=0.01)
+
+
+@pytest.mark.parametrize("window", ("1min", "5min", "1h"))
+def test_aggregate_windows_match_resample(window: str):
+    from src.reporter_lambda.aggregate import AggregationSpec, aggregate
+
+    rng = np.random.default_rng(42)
+    data = pd.DataFrame(
+        {
+            "temperature": rng.uniform(-50, 150, 1000),
+            "timestamp": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 6 * 3600, 1000), unit="s"),
+        }
+    )
+    data = data[~data["timestamp"].between("2025-01-01 02:00", "2025-01-01 03:30")]  # gap longer than any window
+
+    spec = AggregationSpec(windows=["1min", "5min", "1h"], statistics=["mean", "min", "max", "count", "p95"])
+    response = aggregate(data, spec)[window]
+
+    resampled = data.set_index("timestamp").resample(window)["temperature"]
+    expected = resampled.agg(["mean", "min", "max", "count"]).assign(p95=resampled.quantile(0.95))
+    assert response["timestamp"] == [timestamp.isoformat() for timestamp in expected.index]
+    assert response["count"] == expected["count"].tolist()
+
+    gaps = expected["count"] == 0
+    for statistic in ("mean", "min", "max", "p95"):
+        assert [response[statistic][index] for index in np.flatnonzero(gaps)] == [None] * gaps.sum()  # explicit gaps
+        values = [value for value in response[statistic] if value is not None]
+        assert values == pytest.approx(expected.loc[~gaps, statistic].tolist(), abs=0.01)
+
+
+def test_reporter_lambda_handler_with_spec(lambda_context, mocker):
+    from src.reporter_lambda import main
+    from src.reporter_lambda.aggregate import AggregationSpec
+
+    mocker.patch.object(main, "spec", AggregationSpec(windows=["1min", "2min"], statistics=["mean", "count"]))
+    batch = [
+        {"temperature": 100, "timestamp": "2025-01-01 00:12:00"},
+        {"temperature": 50, "timestamp": "2025-01-01 00:14:30"},
+    ]
+
+    response = main.handler({"batch": batch, "source": "EVENT"}, lambda_context)
+    assert response == {
+        "1min": {
+            "timestamp": ["2025-01-01T00:12:00", "2025-01-01T00:13:00", "2025-01-01T00:14:00"],
+            "count": [1, 0, 1],
+            "mean": [100.0, None, 50.0],
+        },
+        "2min": {"timestamp": ["2025-01-01T00:12:00", "2025-01-01T00:14:00"], "count": [1, 1], "mean": [100.0, 50.0]},
+    }
+
+
+@pytest.mark.parametrize(["windows", "statistics"], ((["1min"], ["median"]), (["1ms"], ["mean"]), (["1min"], ["p100"])))
+def test_aggregation_spec_is_validated(windows: list[str], statistics: list[str]):
+    from src.reporter_lambda.aggregate import AggregationSpec
+
+    with pytest.raises(ValueError):
+        AggregationSpec(windows=windows, statistics=statistics)
+
+
+def read_state(dynamodb) -> dict[tuple[str, str], float]:
+    """Mean of each location and minute, from items with `sum_<MM>` and `count_<MM>` of minutes of each hour"""
+    items = dynamodb.scan(TableName=settings.AGGREGATE_STATE_TABLE)["Items"]
+    return {
+        (item["location_id"]["S"], f"{item['hour']['S'][:14]}{name[4:]}:00"): (
+            float(item[name]["N"]) / float(item[f"count_{name[4:]}"]["N"])
+        )
+        for item in items
+        for name in item
+        if name.startswith("sum_")
+    }
+
+
+def test_reporter_lambda_merges_state(lambda_context, mocked_dynamodb, mocker):
+    from src.reporter_lambda import main
+
+    mocker.patch.object(main.context, "state_table", settings.AGGREGATE_STATE_TABLE)
+    mocker.patch.object(main.context, "dynamodb_client", mocked_dynamodb)
+
+    first = [
+        {"location_id": 1, "temperature": 100, "timestamp": "2025-01-01 00:12:00"},
+        {"location_id": 1, "temperature": 50, "timestamp": "2025-01-01 00:13:00"},
+    ]
+    main.handler({"batch": first, "source": "EVENT"}, lambda_context)
+    assert read_state(mocked_dynamodb) == {("1", "2025-01-01T00:12:00"): 100, ("1", "2025-01-01T00:13:00"): 50}
+
+    # late reading updates the minute of the previous run, only new readings are processed
+    late = [
+        {"location_id": 1, "temperature": 20, "timestamp": "2025-01-01 00:12:30"},
+        {"location_id": 2, "temperature": 10, "timestamp": "2025-01-01 00:12:30"},
+    ]
+    response = main.handler({"batch": late, "source": "EVENT"}, lambda_context)
+    assert response == {"2025-01-01T00:12:00": 15}  # response is computed from the batch only
+
+    expected = {("1", "2025-01-01T00:12:00"): 60, ("1", "2025-01-01T00:13:00"): 50, ("2", "2025-01-01T00:12:00"): 10}
+    assert read_state(mocked_dynamodb) == expected
+
+    # retried batch is not merged twice
+    main.handler({"batch": late, "source": "EVENT"}, lambda_context)
+    assert read_state(mocked_dynamodb) == expected
+
+
+@freezegun.freeze_time("2025-01-02T00:00:00")
+def test_reporter_lambda_state_writes_item_per_hour(lambda_context, mocked_dynamodb, mocker):
+    from src.reporter_lambda import main
+
+    mocker.patch.object(main.context, "state_table", settings.AGGREGATE_STATE_TABLE)
+    mocker.patch.object(main.context, "dynamodb_client", mocked_dynamodb)
+    update_item = mocker.spy(mocked_dynamodb, "update_item")
+
+    batch = [
+        {"location_id": 1, "temperature": 10 * minute, "timestamp": f"2025-01-01 00:{minute:02d}:00"}
+        for minute in range(1, 60)
+    ] + [{"location_id": 1, "temperature": 40, "timestamp": "2025-01-01 01:00:00"}]
+    main.handler({"batch": batch, "source": "EVENT"}, lambda_context)
+
+    assert update_item.call_count == 2  # single write for each location and hour
+    assert read_state(mocked_dynamodb)[("1", "2025-01-01T00:59:00")] == 590
+    assert read_state(mocked_dynamodb)[("1", "2025-01-01T01:00:00")] == 40
+
+    # items expire, so the set of merged batches does not grow without bound
+    items = mocked_dynamodb.scan(TableName=settings.AGGREGATE_STATE_TABLE)["Items"]
+    expected = datetime(2025, 1, 2, tzinfo=timezone.utc).timestamp() + main.context.state_ttl_seconds
+    assert [int(item["expires_at"]["N"]) for item in items] == [expected] * 2
+
+
+def test_reporter_lambda_state_requires_location(lambda_context, mocked_dynamodb, mocker):
+    from src.reporter_lambda import main
+
+    mocker.patch.object(main.context, "state_table", settings.AGGREGATE_STATE_TABLE)
+    mocker.patch.object(main.context, "dynamodb_client", mocked_dynamodb)
+
+    with pytest.raises(ValueError):
+        main.handler({"batch": [{"temperature": 1, "timestamp": "2025-01-01"}], "source": "EVENT"}, lambda_context)
+
+
+def test_reporter_lambda_handler_packed(lambda_context):
+    from src.reporter_lambda.main import handler
+
+    batch = [
+        {"location_id": 2, "temperature": 100, "timestamp": "2025-01-01 00:12:00"},
+        {"location_id": 1, "temperature": 50, "timestamp": "2025-01-01 00:12:30"},
+        {"location_id": 2, "temperature": 20, "timestamp": "2025-01-01 00:12:40"},
+        {"location_id": 2, "temperature": 10, "timestamp": "2025-01-01 00:15:00"},
+    ]
+
+    # report of each location, without minutes with no readings
+    response = handler({"batch": batch, "source": "EVENT", "packed": True}, lambda_context)
+    assert response == {
+        "1": {"2025-01-01T00:12:00": 50},
+        "2": {"2025-01-01T00:12:00": 60, "2025-01-01T00:15:00": 10},
+    }
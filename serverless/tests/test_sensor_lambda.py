@@ -1,3 +1,4 @@
+import base64
 import os
 import json
 from typing import Any
@@ -223,3 +224,271 @@ def test_sensor_lambda(
     # assert AWS resources behave as expected
     assert_dynamodb(mocked_dynamodb, settings.SENSOR_REGISTRY_TABLE, expected_dynamodb_content)
     assert_sqs(mocked_sqs, expected_sqs_messages)
+
+
+@pytest.mark.parametrize(
+    "event",
+    (
+        # plain JSON array of readings
+        [
+            {"sensor_id": "1", "location_id": "A", "value": 2000},
+            {"sensor_id": "2", "location_id": "A", "value": 25_000},
+            {"sensor_id": "2", "location_id": "A", "value": 2000},
+            {"sensor_id": "3", "location_id": "B", "value": 1500},
+        ],
+        # SQS style envelope
+        {
+            "Records": [
+                {"body": json.dumps({"sensor_id": "1", "location_id": "A", "value": 2000})},
+                {"body": json.dumps({"sensor_id": "2", "location_id": "A", "value": 25_000})},
+                {"body": json.dumps({"sensor_id": "2", "location_id": "A", "value": 2000})},
+                {"body": json.dumps({"sensor_id": "3", "location_id": "B", "value": 1500})},
+            ]
+        },
+        # Kinesis style envelope
+        {
+            "Records": [
+                {"kinesis": {"data": base64.b64encode(json.dumps(reading).encode("utf-8")).decode("utf-8")}}
+                for reading in (
+                    {"sensor_id": "1", "location_id": "A", "value": 2000},
+                    {"sensor_id": "2", "location_id": "A", "value": 25_000},
+                    {"sensor_id": "2", "location_id": "A", "value": 2000},
+                    {"sensor_id": "3", "location_id": "B", "value": 1500},
+                )
+            ]
+        },
+    ),
+)
+@freezegun.freeze_time(settings.TIME)
+def test_sensor_lambda_batch(event: dict | list, mock_env, mocked_s3, mocked_dynamodb, mocked_sns, mocked_sqs, mocker):
+    mocker.patch.dict(os.environ, mock_env)  # patch environment variables before importing handler
+    prepare_dynamodb(mocked_dynamodb, settings.SENSOR_REGISTRY_TABLE, [{"sensor_id": "3", "working_ok": True}])
+
+    from src.sensor_lambda.main import main
+
+    response = main(event)
+
+    assert response["status_code"] == 200
+    # sensor 2 is marked as broken by the first reading, so the second reading is ignored
+    assert [result["status_code"] for result in response["results"]] == [200, 204, 204, 200]
+    assert_dynamodb(
+        mocked_dynamodb,
+        settings.SENSOR_REGISTRY_TABLE,
+        [
+            {"sensor_id": {"S": "1"}, "working_ok": {"BOOL": True}},
+            {"sensor_id": {"S": "2"}, "working_ok": {"BOOL": False}},
+            {"sensor_id": {"S": "3"}, "working_ok": {"BOOL": True}},
+        ],
+    )
+    assert_sqs(
+        mocked_sqs,
+        [
+            {"sensor_id": "1", "location_id": "A", "status": "OK", "timestamp": settings.TIME},
+            {"sensor_id": "3", "location_id": "B", "status": "OK", "timestamp": settings.TIME},
+        ],
+    )
+
+
+@pytest.mark.parametrize("num_sensors", (1, 25, 26, 100, 250))
+def test_sensor_registry_batch_operations(num_sensors: int, mock_env, mocked_dynamodb, mocker):
+    mocker.patch.dict(os.environ, mock_env)  # patch environment variables before importing handler
+
+    from src.sensor_lambda.dynamodb import SensorRegistryClient
+
+    sensor_registry = SensorRegistryClient(mocked_dynamodb, table_name=settings.SENSOR_REGISTRY_TABLE)
+    sensor_ids = [str(n) for n in range(num_sensors)]
+
+    sensor_registry.put_items(sensor_ids[::2], working_ok=False)
+    statuses = sensor_registry.get_items(sensor_ids)
+
+    assert statuses == {sensor_id: False for sensor_id in sensor_ids[::2]}  # missing sensors are not returned
+
+
+def test_sensor_registry_batch_retries_unprocessed_keys(mocker):
+    from src.sensor_lambda.dynamodb import SensorRegistryClient
+
+    mocker.patch("time.sleep")
+    client = mocker.Mock()
+    client.batch_get_item.side_effect = [
+        {
+            "Responses": {"table": [{"sensor_id": {"S": "1"}, "working_ok": {"BOOL": True}}]},
+            "UnprocessedKeys": {"table": {"Keys": [{"sensor_id": {"S": "2"}}]}},
+        },
+        {"Responses": {"table": [{"sensor_id": {"S": "2"}, "working_ok": {"BOOL": False}}]}, "UnprocessedKeys": {}},
+    ]
+
+    statuses = SensorRegistryClient(client, table_name="table").get_items(["1", "2"])
+
+    assert statuses == {"1": True, "2": False}
+    assert client.batch_get_item.call_count == 2
+
+
+def test_cached_sensor_registry(mocker):
+    from src.sensor_lambda.cache import LRUCache
+    from src.sensor_lambda.dynamodb import CachedSensorRegistryClient
+
+    client = mocker.Mock()
+    client.update_item.return_value = {"Attributes": {"working_ok": {"BOOL": True}}}
+    sensor_registry = CachedSensorRegistryClient(client, table_name="table", cache=LRUCache(max_size=2, ttl_seconds=60))
+
+    with freezegun.freeze_time(settings.TIME) as frozen_time:
+        assert sensor_registry.register("1")
+        assert sensor_registry.register("1")  # hot sensor is answered from cache
+        assert client.update_item.call_count == 1
+
+        sensor_registry.update_item("2", working_ok=False)  # broken sensor is cached when marked broken
+        assert not sensor_registry.register("2")
+        assert client.update_item.call_count == 2
+
+        frozen_time.tick(120)
+        assert sensor_registry.get_items(["2"]) == {"2": False}  # broken sensor never expires
+        assert sensor_registry.register("1")  # working sensor expired after TTL
+        assert client.update_item.call_count == 3
+        client.batch_get_item.assert_not_called()
+
+
+def test_buffered_sender_retries_failed_entries(mocker):
+    from src.sensor_lambda.sensor import SensorStatus
+    from src.sensor_lambda.sqs import BufferedSender
+
+    mocker.patch("time.sleep")
+    context = mocker.Mock(sqs_url="queue")
+    context.sqs.send_message_batch.side_effect = [
+        {"Successful": [{"Id": str(n)} for n in range(9)], "Failed": [{"Id": "9", "SenderFault": False}]},
+        {"Successful": [{"Id": "9"}]},
+        {"Successful": [{"Id": str(n)} for n in range(10, 15)]},
+    ]
+
+    with BufferedSender(context) as sender:
+        for n in range(15):
+            sender.send_message(str(n), "A", 50.0, SensorStatus.OK)
+
+    sent = [call.kwargs["Entries"] for call in context.sqs.send_message_batch.call_args_list]
+    assert [[entry["Id"] for entry in entries] for entries in sent] == [
+        [str(n) for n in range(10)],
+        ["9"],  # only the failed entry is retried
+        [str(n) for n in range(10, 15)],  # remaining messages are flushed on exit
+    ]
+
+
+@freezegun.freeze_time(settings.TIME)
+def test_critical_alerts_are_aggregated(mock_env, mocked_dynamodb, mocker):
+    mocker.patch.dict(os.environ, mock_env)  # patch environment variables before importing handler
+    prepare_dynamodb(
+        mocked_dynamodb,
+        settings.SENSOR_REGISTRY_TABLE,
+        [{"sensor_id": "1", "working_ok": True}, {"sensor_id": "2", "working_ok": True}],
+    )
+
+    from src.sensor_lambda.dynamodb import SensorRegistryClient
+    from src.sensor_lambda.sns import notify_critical
+
+    context = mocker.Mock(alert_window_seconds=60)
+    sensor_registry = SensorRegistryClient(mocked_dynamodb, table_name=settings.SENSOR_REGISTRY_TABLE)
+
+    notify_critical(context, sensor_registry, {("1", "A"): [300.0, 350.0, 310.0], ("2", "B"): [280.0]})
+    assert context.sns.publish.call_count == 2  # single summary for each sensor and location
+    assert "Received 3 critical readings" in context.sns.publish.call_args_list[0].kwargs["Message"]
+
+    notify_critical(context, sensor_registry, {("1", "A"): [320.0, 330.0]})
+    assert context.sns.publish.call_count == 2  # alert for sensor 1 is suppressed within the window
+
+    notify_critical(context, sensor_registry, {("1", "B"): [300.0]})
+    assert context.sns.publish.call_count == 3  # window of other location of the same sensor is not open
+
+    with freezegun.freeze_time("2025-01-01T00:01:01"):  # after the window of 60 seconds
+        notify_critical(context, sensor_registry, {("1", "A"): [340.0]})
+
+    assert context.sns.publish.call_count == 4  # window is reopened with count of suppressed readings
+    assert "2 critical readings were suppressed" in context.sns.publish.call_args_list[-1].kwargs["Message"]
+
+
+def test_vectorized_conversion_matches_scalar():
+    import numpy as np
+
+    from src.sensor_lambda import sensor, vectorized
+
+    r = np.concatenate([np.geomspace(sensor.MIN_R, sensor.MAX_R, num=10_000), [0.1, 20_500]])
+    mask = vectorized.in_range_mask(r)
+    temperatures = vectorized.compute_temperatures(np.where(mask, r, sensor.MIN_R))
+    statuses = [sensor.STATUS_CODES[code] for code in vectorized.get_status_codes(temperatures)]
+
+    assert mask.tolist() == [sensor.is_in_range(value) for value in r]
+    np.testing.assert_allclose(temperatures[mask], [sensor.compute_temperature(value) for value in r[mask]])
+    assert statuses[:-2] == [sensor.get_status(sensor.compute_temperature(value)) for value in r[mask]]
+
+
+@pytest.mark.parametrize("value", (0.5, 100.0, 5_000.0, 20_500.0))
+def test_single_reading_conversion_matches_batch(mock_env, mocker, value: float):
+    mocker.patch.dict(os.environ, mock_env, clear=True)  # patch environment variables before importing handler
+
+    from src.sensor_lambda.main import convert_readings
+
+    reading = {"sensor_id": "1", "location_id": "A", "value": value}
+    single, batch = convert_readings([reading]), convert_readings([reading, reading])
+
+    assert single[0].in_range == batch[0].in_range
+    assert single[0].status == batch[0].status
+    assert single[0].temperature == pytest.approx(batch[0].temperature)
+
+
+def test_single_reading_does_not_import_numpy():
+    import subprocess
+    import sys
+
+    from scripts.cold_start_report import LAMBDA_ENV, SOURCE_PATH
+
+    # numpy adds tens of milliseconds to the cold start, so it must be imported only by batches
+    code = "import sys, main; main.convert_readings([{'sensor_id': 1, 'location_id': 'A', 'value': 100}]); "
+    code += "print('numpy' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SOURCE_PATH / "sensor_lambda",
+        env=os.environ | LAMBDA_ENV,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "False"
+
+
+@freezegun.freeze_time(settings.TIME)
+def test_sensor_lambda_handler_idempotency(mock_env, mocked_dynamodb, mocked_sns, mocked_sqs, mocker):
+    mocker.patch.dict(os.environ, mock_env)  # patch environment variables before importing handler
+
+    from src.sensor_lambda import main
+
+    mocker.patch.object(main.context, "idempotency_key_fields", ["sensor_id", "location_id", "timestamp"])
+    spy = mocker.spy(main, "main")
+    put_record = mocker.spy(main.persistence_store(), "_put_record")
+    lambda_context = mocker.Mock(get_remaining_time_in_millis=lambda: 10_000, **{"function_name": "test_function"})
+
+    event = {"sensor_id": "1", "location_id": "A", "value": 2000, "timestamp": settings.TIME}
+    response = main.handler(event, lambda_context)
+    duplicate = main.handler(dict(event, value=2001), lambda_context)  # same key fields, different payload
+    other = main.handler(dict(event, timestamp="2025-01-01T00:01:00"), lambda_context)
+
+    assert response == duplicate  # duplicate is answered with the stored response
+    assert other["status_code"] == 200
+    assert spy.call_count == 2
+    assert put_record.call_count == 2  # duplicate is answered from local cache without DynamoDB round-trip
+
+
+@freezegun.freeze_time(settings.TIME)
+def test_sensor_lambda_handler_idempotency_missing_key_field(mock_env, mocked_dynamodb, mocked_sns, mocked_sqs, mocker):
+    mocker.patch.dict(os.environ, mock_env)  # patch environment variables before importing handler
+
+    from src.sensor_lambda import main
+
+    mocker.patch.object(main.context, "idempotency_key_fields", ["sensor_id", "location_id", "timestamp"])
+    spy = mocker.spy(main, "main")
+    lambda_context = mocker.Mock(get_remaining_time_in_millis=lambda: 10_000, **{"function_name": "test_function"})
+
+    # readings without timestamp differ only in the value, which is not part of the key
+    event = {"sensor_id": "7", "location_id": "A", "value": 2000}
+    first = main.handler(event, lambda_context)
+    second = main.handler(dict(event, value=2500), lambda_context)
+
+    assert spy.call_count == 2  # both readings are processed
+    assert json.loads(first["body"])["temperature"] != json.loads(second["body"])["temperature"]